@@ -37,6 +37,7 @@ class BackgroundReplacementConfig(BaseModel):
     quality: Optional[str] = "standard"
     format: Optional[str] = "png"
     seed: Optional[int] = None
+    reuseCachedResult: Optional[bool] = False  # Return the last result for identical inputs
 
 
 class BatchOptimizationConfig(BaseModel):
@@ -3,7 +3,11 @@
 Heavy processing only. No database operations here.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import os
+
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from app.api.deps import verify_api_key
@@ -92,3 +96,72 @@ async def get_job_logs(
   if info is None:
     raise HTTPException(status_code=404, detail="Job not found")
   return info
+
+
+LOG_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class _LogRange:
+  # Iterated by Starlette in its threadpool: bytes go from the file to the
+  # response as-is, without decoding or JSON escaping. close() is idempotent so
+  # the end of iteration, a failed pread and the background task can all call it.
+
+  def __init__(self, fd, start, length):
+    self._fd = fd
+    self._start = start
+    self._length = length
+
+  def __iter__(self):
+    try:
+      end = self._start + self._length
+      pos = self._start
+      while pos < end:
+        b = os.pread(self._fd, min(LOG_STREAM_CHUNK_BYTES, end - pos), pos)
+        if not b:
+          break
+        pos += len(b)
+        yield b
+    finally:
+      self.close()
+
+  def close(self):
+    fd, self._fd = self._fd, None
+    if fd is not None:
+      os.close(fd)
+
+
+@router.get("/image-studio/jobs/{job_id}/logs/raw")
+async def get_job_logs_raw(
+  job_id: str,
+  from_bytes: Optional[int] = None,
+  tail: Optional[int] = None,
+  authorized: bool = Depends(verify_api_key),
+):
+  # Plain-text variant of /logs for large tails; offsets go in X-Log-* headers
+  span = IMAGE_STUDIO_QUEUE.get_log_chunk_fd(job_id, from_bytes=from_bytes, tail_bytes=tail)
+  if span is None:
+    info = IMAGE_STUDIO_QUEUE.get_log_chunk(job_id, from_bytes=from_bytes, tail_bytes=tail)
+    if info is None:
+      raise HTTPException(status_code=404, detail="Job not found")
+    headers = {"X-Log-From": str(info["from"]), "X-Log-To": str(info["to"]), "X-Log-Total": str(info["total"])}
+    return Response(content=info["log"], media_type="text/plain; charset=utf-8", headers=headers)
+  fd, start, length, total = span
+  body = _LogRange(fd, start, length)
+  try:
+    headers = {
+      "X-Log-From": str(start),
+      "X-Log-To": str(start + length),
+      "X-Log-Total": str(total),
+      "Content-Length": str(length),
+    }
+    # The background task closes the fd if the client disconnects before the
+    # body is iterated; a pread error closes it from inside the iterator
+    return StreamingResponse(
+      body,
+      media_type="text/plain; charset=utf-8",
+      headers=headers,
+      background=BackgroundTask(body.close),
+    )
+  except Exception:
+    body.close()
+    raise
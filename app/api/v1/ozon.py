@@ -46,6 +46,7 @@ class DownloadRequest(BaseModel):
     field: Literal["offer_id", "sku", "vendor_code"] = Field("offer_id", description="Search field")
     user_id: str = Field(..., description="User ID from frontend (for R2 path isolation)")
     download_images: bool = Field(True, description="If true, download and upload to R2. If false, only return Ozon URLs")
+    force_refresh: bool = Field(False, description="If true, re-download images even if they already exist in R2")
 
 
 class ImageResult(BaseModel):
@@ -176,7 +177,8 @@ async def download_ozon_images(
             "articles": request.articles,
             "field": request.field,
             "r2_service": r2_service,
-            "download_images": request.download_images
+            "download_images": request.download_images,
+            "force_refresh": request.force_refresh
         })
 
         success = bool(result.get("success_images"))
@@ -0,0 +1,45 @@
+"""CPU feature checks that must run before native extensions are imported"""
+
+from importlib import metadata
+from typing import Optional, Set
+
+
+def cpu_flags() -> Optional[Set[str]]:
+    """CPU feature flags from /proc/cpuinfo (None when unavailable, e.g. non-Linux)"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.partition(":")[2].split())
+    except OSError:
+        pass
+    return None
+
+
+def pillow_simd_installed() -> bool:
+    """Whether the installed Pillow is the Pillow-SIMD fork (checked without importing PIL)"""
+    try:
+        metadata.distribution("Pillow-SIMD")
+    except metadata.PackageNotFoundError:
+        return False
+    return True
+
+
+def check_pillow_simd_cpu() -> None:
+    """Refuse to start a Pillow-SIMD build on a CPU without AVX2
+
+    The Docker images compile Pillow-SIMD with -mavx2 (opt-in PILLOW_SIMD=1 build
+    arg); on a host without AVX2 its first resize/filter call dies with SIGILL,
+    which nothing can catch. Must be called before PIL is imported.
+
+    Raises:
+        RuntimeError: If Pillow-SIMD is installed and the CPU reports no AVX2
+    """
+    if not pillow_simd_installed():
+        return
+    flags = cpu_flags()
+    if flags is not None and "avx2" not in flags:
+        raise RuntimeError(
+            "Pillow-SIMD is installed but this CPU has no AVX2; "
+            "rebuild the image without PILLOW_SIMD=1 to use stock Pillow"
+        )
@@ -1,11 +1,23 @@
 """FastAPI application entry point"""
 
+import asyncio
+import sys
+
+from app.core.cpu import check_pillow_simd_cpu
+
+# Before anything imports PIL: an AVX2 Pillow-SIMD build would SIGILL on this host
+check_pillow_simd_cpu()
+
 from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1 import health, image, ozon, ai, image_studio, ws_progress
 from app.plugins.plugin_manager import plugin_manager
 from app.plugins.image.compress import ImageCompressPlugin
 from app.plugins.ozon.download import OzonDownloadPlugin
+from app.plugins.ozon import image_push
+from app.services.ai_processor import AiImageProcessor
+from app.services import ai_processor, image_studio_engine
+from app.services.http import HttpClient
 from app.plugins.ai.playground import AiPlaygroundPlugin
 from app.core.config import settings
 from app.core.logger import setup_logging
@@ -13,6 +25,14 @@ from app.core.logger import setup_logging
 # Setup logging
 setup_logging()
 
+# Use uvloop for every event loop in the process (including asyncio.run() in job workers)
+if sys.platform != "win32":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
 # Create FastAPI app
 app = FastAPI(
     title="Python Capability Service",
@@ -74,4 +94,8 @@ async def startup():
 @app.on_event("shutdown")
 async def shutdown():
     """Cleanup on application shutdown"""
-    pass
+    await image_push.aclose_all()
+    await HttpClient.close()
+    await ai_processor.aclose_all()
+    AiImageProcessor.shutdown()
+    image_studio_engine.shutdown_cpu_pool()
@@ -11,7 +11,7 @@ import logging
 import time
 import uuid
 import threading
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.plugins.base import BasePlugin, ProcessingMode
 from app.services.ai_processor import AiImageProcessor
@@ -104,6 +104,11 @@ class AiPlaygroundPlugin(BasePlugin):
             self._cancel_events[job_id] = threading.Event()
 
         try:
+            # Batch optimization applies one op to every image: collect the downloads
+            # and optimize them together on the process pool after the loop
+            bulk = job_type == "batch_optimization" and len(source_urls) > 1
+            pending: List[Tuple[int, str, bytes]] = []
+
             # Process each image
             for idx, url in enumerate(source_urls):
                 # Check for cancellation
@@ -120,7 +125,7 @@ class AiPlaygroundPlugin(BasePlugin):
 
                 # Download source image
                 try:
-                    image_bytes = self.processor.download_image(url)
+                    image_bytes = await self.processor.download_image(url)
                 except Exception as e:
                     logger.error(f"Failed to download image {idx + 1}: {e}")
                     with self._job_lock:
@@ -129,6 +134,10 @@ class AiPlaygroundPlugin(BasePlugin):
                         job["status"] = "failed"
                     return {"success": False, "error": job["error"]}
 
+                if bulk:
+                    pending.append((idx, url, image_bytes))
+                    continue
+
                 # Process based on job type
                 try:
                     result_bytes, metadata = await self._process_single_image(
@@ -145,34 +154,35 @@ class AiPlaygroundPlugin(BasePlugin):
                         job["status"] = "failed"
                     return {"success": False, "error": job["error"]}
 
-                # Upload result to R2
+                failure = await self._store_result(job_id, idx, url, result_bytes, metadata)
+                if failure:
+                    return failure
+
+            if pending:
                 try:
-                    result_filename = f"ai_playground_{job_id}_{idx + 1}.png"
-                    result_url = await self.r2.upload(
-                        data=result_bytes,
-                        filename=result_filename,
-                        content_type="image/png"
+                    results = await self.processor.process_batch_optimization_bulk(
+                        [image_bytes for _, _, image_bytes in pending],
+                        **self._optimization_options(config)
                     )
                 except Exception as e:
-                    logger.error(f"Failed to upload result {idx + 1}: {e}")
+                    logger.error(f"Failed to optimize batch: {e}")
                     with self._job_lock:
                         job = self._jobs.get(job_id, {})
-                        job["error"] = f"Image {idx + 1} upload failed: {str(e)}"
+                        job["error"] = f"Batch optimization failed: {str(e)}"
                         job["status"] = "failed"
                     return {"success": False, "error": job["error"]}
 
-                # Update job state
-                with self._job_lock:
-                    job = self._jobs.get(job_id, {})
-                    job["result_urls"].append(result_url)
-                    metadata_entry = {
-                        "source_url": url,
-                        "result_url": result_url,
-                        "details": metadata,
-                    }
-                    job["metadata"].append(metadata_entry)
-                    job["processed"] += 1
-                    job["progress"] = int((idx + 1) / len(source_urls) * 100)
+                if self._cancel_events[job_id].is_set():
+                    with self._job_lock:
+                        job = self._jobs.get(job_id, {})
+                        job["status"] = "cancelled"
+                        job["error"] = "Job cancelled"
+                    return {"success": False, "error": "Job cancelled"}
+
+                for (idx, url, _), (result_bytes, metadata) in zip(pending, results):
+                    failure = await self._store_result(job_id, idx, url, result_bytes, metadata)
+                    if failure:
+                        return failure
 
             # Mark job as completed
             with self._job_lock:
@@ -200,6 +210,49 @@ class AiPlaygroundPlugin(BasePlugin):
                 job["error"] = str(e)
             return {"success": False, "error": str(e)}
 
+    async def _store_result(
+        self,
+        job_id: str,
+        idx: int,
+        url: str,
+        result_bytes: bytes,
+        metadata: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Upload one result to R2 and record it on the job
+
+        Returns:
+            Failure response if the upload failed, else None
+        """
+        # Upload result to R2
+        try:
+            result_filename = f"ai_playground_{job_id}_{idx + 1}.png"
+            result_url = await self.r2.upload(
+                data=result_bytes,
+                filename=result_filename,
+                content_type="image/png"
+            )
+        except Exception as e:
+            logger.error(f"Failed to upload result {idx + 1}: {e}")
+            with self._job_lock:
+                job = self._jobs.get(job_id, {})
+                job["error"] = f"Image {idx + 1} upload failed: {str(e)}"
+                job["status"] = "failed"
+            return {"success": False, "error": job["error"]}
+
+        # Update job state
+        with self._job_lock:
+            job = self._jobs.get(job_id, {})
+            job["result_urls"].append(result_url)
+            metadata_entry = {
+                "source_url": url,
+                "result_url": result_url,
+                "details": metadata,
+            }
+            job["metadata"].append(metadata_entry)
+            job["processed"] += 1
+            job["progress"] = int((idx + 1) / job["total"] * 100)
+        return None
+
     async def _process_single_image(
         self,
         job_type: str,
@@ -223,28 +276,23 @@ class AiPlaygroundPlugin(BasePlugin):
             negative_prompt = config.get("negativePrompt", "")
             quality = config.get("quality", "standard")
             temperature = 0.5 if quality == "standard" else 0.3 if quality == "high" else 0.7
+            # Sampled generation: only reuse a cached result when the caller asks for it
+            reuse_cached = config.get("reuseCachedResult", False)
 
             return await self.processor.process_background_replacement(
                 image_data=image_bytes,
                 background_prompt=background_prompt,
                 negative_prompt=negative_prompt,
                 temperature=temperature,
-                cancel_check=cancel_check
+                cancel_check=cancel_check,
+                cache_check=reuse_cached
             )
 
         elif job_type == "batch_optimization":
-            quality = config.get("quality", "standard")
-            output_format = config.get("format", "webp")
-            max_size = config.get("maxSize", 1920)
-            maintain_aspect = config.get("maintainAspect", True)
-
             return await self.processor.process_batch_optimization(
                 image_data=image_bytes,
-                quality=quality,
-                output_format=output_format,
-                max_size=max_size,
-                maintain_aspect=maintain_aspect,
-                cancel_check=cancel_check
+                cancel_check=cancel_check,
+                **self._optimization_options(config)
             )
 
         elif job_type == "image_enhancement":
@@ -265,6 +313,16 @@ class AiPlaygroundPlugin(BasePlugin):
         else:
             raise ValueError(f"Unknown job type: {job_type}")
 
+    @staticmethod
+    def _optimization_options(config: Dict[str, Any]) -> Dict[str, Any]:
+        """Batch optimization parameters from a job config"""
+        return {
+            "quality": config.get("quality", "standard"),
+            "output_format": config.get("format", "webp"),
+            "max_size": config.get("maxSize", 1920),
+            "maintain_aspect": config.get("maintainAspect", True),
+        }
+
     def _check_cancelled(self, job_id: str) -> bool:
         """Check if a job has been cancelled
 
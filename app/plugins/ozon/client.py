@@ -1,5 +1,6 @@
 """Ozon Seller API client"""
 
+import asyncio
 import json
 import logging
 from typing import Optional, List, Dict
@@ -10,6 +11,26 @@ import os
 logger = logging.getLogger(__name__)
 
 
+async def _close_session(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a session on the event loop that created it"""
+    if session.closed:
+        return
+    if loop is None or loop is asyncio.get_running_loop():
+        await session.close()
+    elif loop.is_running():
+        # Sessions are bound to their loop: hand the close over to it
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+    else:
+        # The owning loop is gone: detach and close the connector's sockets directly
+        connector = session.connector
+        session.detach()
+        if connector is not None:
+            try:
+                await connector.close()
+            except Exception as e:
+                logger.debug(f"Error closing stale Ozon connector: {e}")
+
+
 class OzonClient:
     """
     Client for Ozon Seller API.
@@ -30,6 +51,21 @@ class OzonClient:
         self.api_key = api_key
         self.base_url = "https://api-seller.ozon.ru"
         self.timeout = ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get keep-alive session for the running event loop (created lazily)"""
+        loop = asyncio.get_running_loop()
+        session = self._session
+        if session is not None and not session.closed and self._session_loop is loop:
+            return session
+        if session is not None:
+            # Called from a different loop: release the old session instead of leaking it
+            await _close_session(session, self._session_loop)
+        self._session = aiohttp.ClientSession(timeout=self.timeout)
+        self._session_loop = loop
+        return self._session
 
     async def _post(self, path: str, payload: dict) -> dict:
         """
@@ -51,62 +87,62 @@ class OzonClient:
 
         logger.debug(f"Ozon API POST {path} payload={json.dumps(payload, ensure_ascii=False)}")
 
-        async with aiohttp.ClientSession(timeout=self.timeout) as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                # Ozon API returns text/plain Content-Type, so we need to ignore content type check
-                # Also, get raw text first to handle potential formatting issues
-                text = await response.text()
-
-                # Log the raw response for debugging
-                if os.environ.get("OZON_DEBUG") == "1":
-                    logger.debug(f"Ozon API raw response {path}: {text}")
-
-                # Parse JSON, handling potential extra whitespace or multiple objects
+        session = await self._get_session()
+        async with session.post(url, json=payload, headers=headers) as response:
+            # Ozon API returns text/plain Content-Type, so we need to ignore content type check
+            # Also, get raw text first to handle potential formatting issues
+            text = await response.text()
+
+            # Log the raw response for debugging
+            if os.environ.get("OZON_DEBUG") == "1":
+                logger.debug(f"Ozon API raw response {path}: {text}")
+
+            # Parse JSON, handling potential extra whitespace or multiple objects
+            try:
+                # Try parsing the full response first
+                data = json.loads(text)
+            except json.JSONDecodeError as e:
+                # If that fails, try to extract just the first JSON object
+                # Ozon sometimes returns responses with extra whitespace/newlines
+                logger.warning(f"JSON parse error on {path}, trying to clean response: {e}")
+                logger.warning(f"Raw response text (first 500 chars): {text[:500]}")
+
+                # Try stripping whitespace
                 try:
-                    # Try parsing the full response first
-                    data = json.loads(text)
-                except json.JSONDecodeError as e:
-                    # If that fails, try to extract just the first JSON object
-                    # Ozon sometimes returns responses with extra whitespace/newlines
-                    logger.warning(f"JSON parse error on {path}, trying to clean response: {e}")
-                    logger.warning(f"Raw response text (first 500 chars): {text[:500]}")
-
-                    # Try stripping whitespace
-                    try:
-                        data = json.loads(text.strip())
-                    except json.JSONDecodeError:
-                        # If still failing, try extracting first JSON object
-                        # Find matching braces
-                        text = text.strip()
-                        if text.startswith('{'):
-                            # Find matching closing brace
-                            brace_count = 0
-                            end_pos = 0
-                            for i, char in enumerate(text):
-                                if char == '{':
-                                    brace_count += 1
-                                elif char == '}':
-                                    brace_count -= 1
-                                if brace_count == 0:
-                                    end_pos = i + 1
-                                    break
-                            if end_pos > 0:
-                                data = json.loads(text[:end_pos])
-                            else:
-                                raise
+                    data = json.loads(text.strip())
+                except json.JSONDecodeError:
+                    # If still failing, try extracting first JSON object
+                    # Find matching braces
+                    text = text.strip()
+                    if text.startswith('{'):
+                        # Find matching closing brace
+                        brace_count = 0
+                        end_pos = 0
+                        for i, char in enumerate(text):
+                            if char == '{':
+                                brace_count += 1
+                            elif char == '}':
+                                brace_count -= 1
+                            if brace_count == 0:
+                                end_pos = i + 1
+                                break
+                        if end_pos > 0:
+                            data = json.loads(text[:end_pos])
                         else:
                             raise
+                    else:
+                        raise
 
-                if response.status != 200:
-                    logger.warning(
-                        "Ozon API non-200 response %s %s: %s",
-                        response.status,
-                        path,
-                        data
-                    )
-                if os.environ.get("OZON_DEBUG") == "1":
-                    logger.debug("Ozon API response %s: %s", path, data)
-                return data
+            if response.status != 200:
+                logger.warning(
+                    "Ozon API non-200 response %s %s: %s",
+                    response.status,
+                    path,
+                    data
+                )
+            if os.environ.get("OZON_DEBUG") == "1":
+                logger.debug("Ozon API response %s: %s", path, data)
+            return data
 
     def _value_matches(self, value: object, target: str) -> bool:
         """Match target string against scalar or list values."""
@@ -352,5 +388,8 @@ class OzonClient:
 
     async def close(self):
         """Close the client (cleanup)"""
-        # Client is stateless, nothing to close
-        pass
+        session, loop = self._session, self._session_loop
+        self._session = None
+        self._session_loop = None
+        if session is not None:
+            await _close_session(session, loop)
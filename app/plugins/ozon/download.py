@@ -1,17 +1,30 @@
 """Ozon download plugin - main orchestrator"""
 
 import asyncio
+import hashlib
 import logging
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
 from app.plugins.base import BasePlugin, ProcessingMode
 from app.plugins.ozon.client import OzonClient
-from app.plugins.ozon.downloader import download_and_upload_to_r2, generate_r2_path
+from app.plugins.ozon.downloader import (
+    DEFAULT_MAX_IMAGE_BYTES,
+    download_and_upload_to_r2,
+    generate_r2_path,
+)
 from app.services.storage import R2StorageService
 
 logger = logging.getLogger(__name__)
 
+# R2 user-metadata key holding a hash of the Ozon URL an object was downloaded from.
+# R2 keys are position-based, so this is what tells a reusable object from a stale one.
+SOURCE_URL_META_KEY = "source-url-sha256"
+
+
+def _source_url_digest(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
 
 class OzonDownloadPlugin(BasePlugin):
     """
@@ -40,6 +53,8 @@ class OzonDownloadPlugin(BasePlugin):
         self.max_workers = config.get("max_workers", 5)
         self.timeout = config.get("timeout_sec", 20)
         self.default_field = config.get("default_field", "offer_id")
+        self.skip_existing = config.get("skip_existing", True)
+        self.max_image_bytes = config.get("max_image_bytes", DEFAULT_MAX_IMAGE_BYTES)
 
     async def process(self, input_data: dict) -> dict:
         """
@@ -55,7 +70,8 @@ class OzonDownloadPlugin(BasePlugin):
                 "articles": List[str],
                 "field": str (optional),
                 "r2_service": R2StorageService,
-                "download_images": bool (optional, default=True)
+                "download_images": bool (optional, default=True),
+                "force_refresh": bool (optional, default=False)
             }
 
         Returns:
@@ -67,6 +83,7 @@ class OzonDownloadPlugin(BasePlugin):
         field = input_data.get("field", self.default_field)
         r2_service = input_data.get("r2_service")
         download_images = input_data.get("download_images", True)
+        force_refresh = input_data.get("force_refresh", False)
 
         if not user_id or not r2_service:
             raise ValueError("Missing required fields: user_id, r2_service")
@@ -99,7 +116,8 @@ class OzonDownloadPlugin(BasePlugin):
                     article=article,
                     field=field,
                     r2_service=r2_service,
-                    download_images=download_images
+                    download_images=download_images,
+                    force_refresh=force_refresh
                 )
 
                 result["items"].append(item_result)
@@ -121,7 +139,8 @@ class OzonDownloadPlugin(BasePlugin):
         article: str,
         field: str,
         r2_service: R2StorageService,
-        download_images: bool = True
+        download_images: bool = True,
+        force_refresh: bool = False
     ) -> dict:
         """
         Process a single article.
@@ -133,6 +152,7 @@ class OzonDownloadPlugin(BasePlugin):
             field: Search field type
             r2_service: R2 storage service
             download_images: If True, download and upload to R2. If False, only return Ozon URLs.
+            force_refresh: If True, re-download images even if they already exist in R2.
 
         Returns:
             {
@@ -204,24 +224,53 @@ class OzonDownloadPlugin(BasePlugin):
             "urls": []
         }
 
+        # Precompute R2 paths (index-based, so stable across re-runs)
+        r2_paths = [
+            generate_r2_path(user_id, article, i + 1, self._get_extension_from_url(url))
+            for i, url in enumerate(image_urls)
+        ]
+        source_digests = [_source_url_digest(url) for url in image_urls]
+
+        # Reuse an existing R2 object only if it was downloaded from the same Ozon URL:
+        # paths follow image position, so a replaced or reordered image lands on a path
+        # that holds another image (all HEADs before any GET)
+        existing = [False] * len(image_urls)
+        if self.skip_existing and not force_refresh:
+            head_results = await asyncio.gather(
+                *[r2_service.get_metadata(path) for path in r2_paths],
+                return_exceptions=True
+            )
+            existing = [
+                isinstance(meta, dict) and meta.get(SOURCE_URL_META_KEY) == digest
+                for meta, digest in zip(head_results, source_digests)
+            ]
+            skipped = sum(existing)
+            if skipped:
+                logger.info(f"Skipping {skipped} images already in R2 for article={article}")
+
         # Create semaphore for concurrent control
         semaphore = asyncio.Semaphore(self.max_workers)
 
         async def download_single(index: int, url: str) -> Optional[str]:
             """Download single image and upload to R2"""
-            async with semaphore:
-                # Detect extension from URL
-                extension = self._get_extension_from_url(url)
+            r2_path = r2_paths[index]
 
-                # Generate R2 path
-                r2_path = generate_r2_path(user_id, article, index + 1, extension)
+            if existing[index]:
+                public_url = r2_service.get_public_url(r2_path)
+                stats["success"] += 1
+                stats["urls"].append(public_url)
+                logger.debug(f"Already in R2, skipped download {url} -> {public_url}")
+                return public_url
 
+            async with semaphore:
                 # Download and upload
                 success, public_url, error = await download_and_upload_to_r2(
                     url=url,
                     r2_path=r2_path,
                     r2_service=r2_service,
-                    timeout=self.timeout
+                    timeout=self.timeout,
+                    max_bytes=self.max_image_bytes,
+                    metadata={SOURCE_URL_META_KEY: source_digests[index]}
                 )
 
                 if success:
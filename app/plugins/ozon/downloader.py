@@ -1,20 +1,34 @@
 """Image downloader with direct R2 upload (no local storage)"""
 
+import asyncio
+import base64
 import logging
 import aiohttp
-from typing import Tuple, Optional
+from urllib.parse import unquote_to_bytes
+from typing import Dict, Tuple, Optional
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+# Data URLs larger than this are decoded in a worker thread to keep the event loop free
+INLINE_DECODE_MAX_CHARS = 4096
 
-async def download_image_to_bytes(url: str, timeout: int = 30) -> Tuple[bool, Optional[bytes], Optional[str]]:
+# Upper bound for a single downloaded image (bounds memory per concurrent download)
+DEFAULT_MAX_IMAGE_BYTES = 25 * 1024 * 1024
+
+
+async def download_image_to_bytes(
+    url: str,
+    timeout: int = 30,
+    max_bytes: int = DEFAULT_MAX_IMAGE_BYTES
+) -> Tuple[bool, Optional[bytes], Optional[str]]:
     """
     Download image directly to memory (bytes).
 
     Args:
         url: Image URL (supports http/https and data URLs)
         timeout: Request timeout in seconds (default: 30)
+        max_bytes: Maximum image size in bytes, larger responses fail with IMAGE_TOO_LARGE
 
     Returns:
         Tuple of (success, image_bytes, error_message)
@@ -22,14 +36,13 @@ async def download_image_to_bytes(url: str, timeout: int = 30) -> Tuple[bool, Op
     # Handle data URLs
     if url.startswith("data:"):
         try:
-            import base64
-            from urllib.parse import unquote_to_bytes
-
             header, data = url.split(",", 1)
-            if ";base64" in header:
-                image_bytes = base64.b64decode(data)
+            decode = base64.b64decode if ";base64" in header else unquote_to_bytes
+            if len(data) < INLINE_DECODE_MAX_CHARS:
+                image_bytes = decode(data)
             else:
-                image_bytes = unquote_to_bytes(data)
+                loop = asyncio.get_running_loop()
+                image_bytes = await loop.run_in_executor(None, decode, data)
 
             return True, image_bytes, None
 
@@ -54,8 +67,19 @@ async def download_image_to_bytes(url: str, timeout: int = 30) -> Tuple[bool, Op
         async with aiohttp.ClientSession() as session:
             async with session.get(url, headers=headers, timeout=timeout_config, ssl=False) as response:
                 if response.status == 200:
-                    image_bytes = await response.read()
-                    return True, image_bytes, None
+                    if max_bytes and (response.content_length or 0) > max_bytes:
+                        logger.error(f"Image too large {url}: {response.content_length} bytes")
+                        return False, None, "IMAGE_TOO_LARGE"
+
+                    chunks = []
+                    total = 0
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        total += len(chunk)
+                        if max_bytes and total > max_bytes:
+                            logger.error(f"Image too large {url}: over {max_bytes} bytes")
+                            return False, None, "IMAGE_TOO_LARGE"
+                        chunks.append(chunk)
+                    return True, b"".join(chunks), None
                 else:
                     error = f"HTTP {response.status}"
                     logger.error(f"Failed to download {url}: {error}")
@@ -73,7 +97,9 @@ async def download_and_upload_to_r2(
     url: str,
     r2_path: str,
     r2_service,
-    timeout: int = 20
+    timeout: int = 20,
+    max_bytes: int = DEFAULT_MAX_IMAGE_BYTES,
+    metadata: Optional[Dict[str, str]] = None
 ) -> Tuple[bool, Optional[str], Optional[str]]:
     """
     Download image and directly upload to R2 (streaming, no local storage).
@@ -83,19 +109,21 @@ async def download_and_upload_to_r2(
         r2_path: Destination path in R2
         r2_service: R2StorageService instance
         timeout: Request timeout in seconds
+        max_bytes: Maximum image size in bytes
+        metadata: Optional user metadata stored with the R2 object
 
     Returns:
         Tuple of (success, r2_public_url, error_message)
     """
     # Download to memory
-    success, image_bytes, error = await download_image_to_bytes(url, timeout)
+    success, image_bytes, error = await download_image_to_bytes(url, timeout, max_bytes)
 
     if not success:
         return False, None, error
 
     # Upload directly to R2
     try:
-        public_url = await r2_service.upload_bytes(image_bytes, r2_path)
+        public_url = await r2_service.upload_bytes(image_bytes, r2_path, metadata=metadata)
         return True, public_url, None
     except Exception as e:
         logger.error(f"Error uploading to R2: {e}")
@@ -1,12 +1,48 @@
 """Ozon image push plugin for updating product pictures."""
 
+from collections import OrderedDict
 from typing import Optional, List, Dict, Any
+import hashlib
 import logging
+import re
 
 from app.plugins.ozon.client import OzonClient
 
 logger = logging.getLogger(__name__)
 
+_URL_RE = re.compile(r"https?://")
+
+# Long-lived Ozon clients keyed by a hash of the credential (keeps TCP+TLS warm)
+_CLIENT_CACHE_MAX = 64
+_CLIENT_CACHE: "OrderedDict[str, OzonClient]" = OrderedDict()
+
+
+async def _get_client(client_id: str, api_key: str) -> OzonClient:
+    """Get a cached OzonClient for the credential, creating it if needed."""
+    cache_key = hashlib.sha256(f"{client_id}\0{api_key}".encode("utf-8")).hexdigest()
+    client = _CLIENT_CACHE.get(cache_key)
+    if client is not None:
+        _CLIENT_CACHE.move_to_end(cache_key)
+        return client
+
+    client = OzonClient(client_id, api_key)
+    _CLIENT_CACHE[cache_key] = client
+    while len(_CLIENT_CACHE) > _CLIENT_CACHE_MAX:
+        _, evicted = _CLIENT_CACHE.popitem(last=False)
+        await evicted.close()
+    return client
+
+
+async def aclose_all() -> None:
+    """Close all cached Ozon clients (call on application shutdown)."""
+    clients = list(_CLIENT_CACHE.values())
+    _CLIENT_CACHE.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Error closing Ozon client: {e}")
+
 
 class OzonImagePushPlugin:
     """Plugin for pushing images to Ozon product listings."""
@@ -43,9 +79,9 @@ class OzonImagePushPlugin:
             return {"success": False, "errors": validation["errors"]}
 
         try:
-            # Step 2: Create Ozon client
+            # Step 2: Get (shared) Ozon client
             credential = context.get("credential", {})
-            client = OzonClient(
+            client = await _get_client(
                 credential.get("client_id", ""),
                 credential.get("api_key", "")
             )
@@ -88,36 +124,29 @@ class OzonImagePushPlugin:
             Dict with "errors" list (empty if valid)
         """
         errors = []
+        images = context.get("images") or []
+        images360 = context.get("images360") or []
 
         # URL format validation for images array
-        for field in ["images", "images360"]:
-            urls = context.get(field, [])
+        match_url = _URL_RE.match
+        for field, urls in (("images", images), ("images360", images360)):
             for i, url in enumerate(urls):
-                if not isinstance(url, str):
-                    errors.append({
-                        "field": field,
-                        "index": i,
-                        "url": str(url),
-                        "reason": "Invalid URL format"
-                    })
+                if isinstance(url, str) and match_url(url):
                     continue
-                if not url.startswith(("http://", "https://")):
-                    errors.append({
-                        "field": field,
-                        "index": i,
-                        "url": url,
-                        "reason": "Invalid URL format"
-                    })
+                errors.append({
+                    "field": field,
+                    "index": i,
+                    "url": url if isinstance(url, str) else str(url),
+                    "reason": "Invalid URL format"
+                })
 
         # Quantity limits validation
-        images = context.get("images", [])
         if len(images) > 30:
             errors.append({
                 "field": "images",
                 "reason": "Exceeds limit (30)"
             })
 
-        images360 = context.get("images360", [])
         if len(images360) > 70:
             errors.append({
                 "field": "images360",
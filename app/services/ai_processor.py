@@ -7,18 +7,559 @@ This module contains the heavy lifting logic for:
 """
 
 from __future__ import annotations
+import asyncio
 import base64
+import binascii
+import hashlib
 import io
-import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from urllib.parse import unquote_to_bytes
 from typing import Dict, Any, List, Optional, Tuple
-from PIL import Image, ImageFilter, ImageEnhance
-import aiohttp
+import PIL
+from PIL import Image, ImageChops, ImageFilter, ImageStat, features
+import aiofiles
+import httpx
+import orjson
 import requests
 import logging
 
+from app.services.async_utils import AsyncFileDownloader
+from app.services.http import HttpClient
+
 logger = logging.getLogger(__name__)
 
+# Pillow-SIMD publishes ".postN" versions; log which build handles resize/filter hot paths
+# and whether JPEG encode/decode goes through libjpeg-turbo
+PILLOW_SIMD = ".post" in PIL.__version__
+LIBJPEG_TURBO = bool(features.check_feature("libjpeg_turbo"))
+logger.info(f"Pillow {PIL.__version__} (SIMD build: {PILLOW_SIMD}, libjpeg-turbo: {LIBJPEG_TURBO})")
+
+
+# Image generation can take minutes; overrides the shared session's 30s default
+_API_TIMEOUT = httpx.Timeout(300, connect=20)
+
+# Constant parts of the generateContent request body; only the base64 image, the
+# prompt and the temperature vary, so the body is spliced together without json.dumps
+_ENVELOPE_HEAD = b'{"contents":[{"parts":[{"inlineData":{"mimeType":"image/png","data":"'
+_ENVELOPE_PROMPT = b'"}},{"text":'
+_ENVELOPE_TEMPERATURE = b'}]}],"generationConfig":{"temperature":'
+_ENVELOPE_TAIL = b'}}'
+
+
+def _build_request_body(base64_image: bytes, prompt: str, temperature: float) -> bytes:
+    """Build the generateContent JSON body around already-encoded base64 bytes
+
+    Args:
+        base64_image: Base64-encoded PNG (ASCII bytes, no JSON escaping needed)
+        prompt: Text prompt (JSON-escaped here)
+        temperature: Sampling temperature
+
+    Returns:
+        UTF-8 JSON request body
+    """
+    return b"".join((
+        _ENVELOPE_HEAD, base64_image,
+        _ENVELOPE_PROMPT, orjson.dumps(prompt),
+        _ENVELOPE_TEMPERATURE, orjson.dumps(float(temperature)),
+        _ENVELOPE_TAIL,
+    ))
+
+
+# ImageFilter.SHARPEN (3x3, scale 16) followed by ImageFilter.SMOOTH (3x3, scale 13),
+# fused into their 5x5 convolution (scale 16 * 13 = 208) to halve the passes over the
+# pixels. This approximates the two-pass chain rather than equalling it: the chain clips
+# the sharpened intermediate to 0..255 and the fused kernel does not, so wherever
+# sharpening overshoots (hard edges, noise) the results differ, by ~30 levels on a
+# black/white step and more on pure noise; elsewhere they match. Pillow also leaves
+# the outer 2 px unfiltered instead of 1 px.
+_SHARPEN_SMOOTH = ImageFilter.Kernel((5, 5), (
+    -2, -4, -6, -4, -2,
+    -4, 18, 14, 18, -4,
+    -6, 14, 144, 14, -6,
+    -4, 18, 14, 18, -4,
+    -2, -4, -6, -4, -2,
+), scale=208)
+
+
+def _contrast_brightness_lut(mean: int, contrast: float, brightness: float) -> List[int]:
+    """Build a 256-entry LUT equivalent to ImageEnhance.Contrast followed by Brightness
+
+    Both enhancers are per-pixel blends (with the gray mean and with black), so the
+    pair collapses into a single lookup that Image.point applies in one C pass.
+    """
+    lut = []
+    for v in range(256):
+        c = mean + contrast * (v - mean)
+        c = 0 if c <= 0 else 255 if c >= 255 else int(c)
+        b = brightness * c
+        lut.append(0 if b <= 0 else 255 if b >= 255 else int(b))
+    return lut
+
+
+def _luma_mean(image: Image.Image) -> float:
+    """Mean gray level of an RGB (or L) image, as ImageStat.Stat(image.convert("L")) reports it
+
+    L is a fixed linear combination of R, G and B (ITU-R 601-2), so its mean is the
+    same combination of the per-channel means, read from one histogram pass instead
+    of allocating and scanning a full grayscale copy.
+    """
+    means = ImageStat.Stat(image).mean
+    if image.mode == "L":
+        return means[0]
+    r, g, b = means[:3]
+    return r * 0.299 + g * 0.587 + b * 0.114
+
+
+def _open_rgb(image_data: bytes) -> Image.Image:
+    """Decode image bytes into a loaded RGB image"""
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.load()
+    return image
+
+
+# Per-thread reusable encode buffers (worker threads/processes encode many images)
+_BUF_POOL = threading.local()
+_BUF_INITIAL_SIZE = 4 << 20
+_BUF_MAX_RETAINED = 32 << 20
+
+
+class _PooledWriter(io.RawIOBase):
+    """Write-only file object backed by this thread's reusable bytearray
+
+    Unlike a fresh BytesIO per encode, the backing buffer keeps its capacity
+    between calls, so repeated encodes don't churn multi-MB allocations. The
+    buffer is only allocated on a thread's first write, and an encode that
+    outgrows _BUF_MAX_RETAINED runs in a private buffer that is not kept.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buf = None
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def _reserve(self, end: int) -> bytearray:
+        buf = self._buf if self._buf is not None else getattr(_BUF_POOL, "buf", None)
+        if buf is not None and end <= len(buf):
+            self._buf = buf
+            return buf
+        cap = max(end, 2 * len(buf) if buf is not None else 0, _BUF_INITIAL_SIZE)
+        grown = bytearray(cap)
+        if self._pos:
+            grown[:self._pos] = self._buf[:self._pos]
+        if cap <= _BUF_MAX_RETAINED:
+            _BUF_POOL.buf = grown
+        self._buf = grown
+        return grown
+
+    def write(self, data) -> int:
+        n = len(data)
+        end = self._pos + n
+        buf = self._buf
+        if buf is None or end > len(buf):
+            buf = self._reserve(end)
+        buf[self._pos:end] = data
+        self._pos = end
+        return n
+
+    def getbuffer(self) -> memoryview:
+        """View of the written bytes (valid until the next encode on this thread)"""
+        if self._buf is None:
+            return memoryview(b"")
+        return memoryview(self._buf)[:self._pos]
+
+    def getvalue(self) -> bytes:
+        return bytes(self.getbuffer())
+
+
+def _save_to_bytes(image: Image.Image, **save_kwargs) -> bytes:
+    """Encode image into the thread's pooled buffer and return a bytes copy"""
+    with _PooledWriter() as output:
+        image.save(output, **save_kwargs)
+        return output.getvalue()
+
+
+def _encode_png(image: Image.Image) -> bytes:
+    """Encode image as PNG bytes"""
+    return _save_to_bytes(image, format="PNG")
+
+
+def _encode_png_base64(image: Image.Image) -> bytes:
+    """Encode image as fast-compressed PNG and return base64 bytes"""
+    with _PooledWriter() as output:
+        image.save(output, format="PNG", compress_level=1)
+        return base64.b64encode(output.getbuffer())
+
+
+def _resize(image: Image.Image, size: Tuple[int, int], strategy: str = "auto") -> Image.Image:
+    """Resize an image, picking the resampling path by scale factor
+
+    Args:
+        image: Source image
+        size: Target (width, height)
+        strategy: "auto" (box-reduce large downscales first, bicubic for exact 2x
+            upscales) or "lanczos" (always plain LANCZOS)
+
+    Returns:
+        Resized image
+    """
+    if strategy == "auto":
+        factor = min(image.width / size[0], image.height / size[1])
+        if factor >= 2.0:
+            # Integer box reduce is cheap; LANCZOS then only covers the remaining < 2x
+            image = image.reduce(int(factor))
+        elif size == (image.width * 2, image.height * 2):
+            return image.resize(size, Image.Resampling.BICUBIC)
+    if image.size == size:
+        return image
+    return image.resize(size, Image.Resampling.LANCZOS)
+
+
+def _open_for_target(image_data: bytes, target: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Open an image that will be downscaled to fit within target x target
+
+    For JPEG this asks libjpeg to decode at a reduced DCT scale (draft mode), keeping
+    at least 2x the target so the final resample still has headroom. This trades exact
+    full-resolution pixels for speed, which is fine for batch optimization but not for
+    paths that need the original pixel data.
+
+    Args:
+        image_data: Encoded image bytes
+        target: Maximum output dimension (0 disables draft decoding)
+
+    Returns:
+        Tuple of (image, original (width, height))
+    """
+    image = Image.open(io.BytesIO(image_data))
+    original = image.size
+    if target and image.format == "JPEG":
+        image.draft("RGB", (target * 2, target * 2))
+    return image, original
+
+
+def _auto_quality(image: Image.Image) -> int:
+    """Pick a lossy quality level from the image's edge density
+
+    Mean absolute neighbour difference of a 128x128 grayscale thumbnail: flat
+    product shots hide artifacts well at lower quality, detailed ones need more.
+    """
+    small = image.convert("L").resize((128, 128), Image.Resampling.BILINEAR)
+    dx = ImageStat.Stat(ImageChops.difference(small, ImageChops.offset(small, 1, 0))).mean[0]
+    dy = ImageStat.Stat(ImageChops.difference(small, ImageChops.offset(small, 0, 1))).mean[0]
+    edge = dx + dy
+    if edge < 8:
+        return 75
+    if edge < 20:
+        return 85
+    return 92
+
+
+def _optimize_image(
+    image_data: bytes,
+    quality: str,
+    output_format: str,
+    max_size: int,
+    maintain_aspect: bool,
+    webp_method: int = 4,
+    resample_strategy: str = "auto"
+) -> Tuple[bytes, Dict[str, Any]]:
+    """CPU-bound body of process_batch_optimization (runs in a worker thread/process)"""
+    image, (original_width, original_height) = _open_for_target(image_data, max_size)
+    original_size = len(image_data)
+
+    # Determine quality values
+    quality_map = {"low": 70, "standard": 85, "high": 95}
+    jpeg_quality = quality_map.get(quality, 85)
+
+    # Resize if needed
+    if max_size and (image.width > max_size or image.height > max_size):
+        if maintain_aspect:
+            ratio = min(max_size / image.width, max_size / image.height)
+            target = (max(1, round(image.width * ratio)), max(1, round(image.height * ratio)))
+        else:
+            target = (max_size, max_size)
+        image = _resize(image, target, resample_strategy)
+
+    # Pick quality/format from image content when asked to ("auto")
+    if quality == "auto":
+        jpeg_quality = _auto_quality(image)
+    if output_format.lower() == "auto":
+        # Few distinct colors (logos, line art) compress best losslessly
+        output_format = "png" if image.getcolors(256) is not None else "webp"
+
+    # Determine format
+    format_map = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+    pil_format = format_map.get(output_format.lower(), "PNG")
+
+    # Save with optimization
+    # (Pillow's JPEG codec is libjpeg-turbo; optimize only pays off for PNG, for JPEG
+    # it adds a second Huffman pass and WebP ignores it)
+    save_kwargs = {}
+    if pil_format in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = jpeg_quality
+    if pil_format == "WEBP":
+        save_kwargs["method"] = webp_method
+    elif pil_format == "PNG":
+        save_kwargs["optimize"] = True
+
+    result_bytes = _save_to_bytes(image, format=pil_format, **save_kwargs)
+
+    metadata = {
+        "original_width": original_width,
+        "original_height": original_height,
+        "result_width": image.width,
+        "result_height": image.height,
+        "original_size": original_size,
+        "result_size": len(result_bytes),
+        "compression_ratio": round(1 - len(result_bytes) / original_size, 2),
+        "quality": quality,
+        "format": output_format,
+    }
+    if quality == "auto":
+        metadata["auto_quality"] = jpeg_quality
+
+    return result_bytes, metadata
+
+
+def _optimize_chunk(
+    images: List[bytes],
+    quality: str,
+    output_format: str,
+    max_size: int,
+    maintain_aspect: bool,
+    webp_method: int,
+    resample_strategy: str = "auto"
+) -> List[Tuple[bytes, Dict[str, Any]]]:
+    """Optimize a chunk of images inside one pool worker (only bytes cross the process boundary)"""
+    return [
+        _optimize_image(
+            data, quality, output_format, max_size, maintain_aspect, webp_method, resample_strategy
+        )
+        for data in images
+    ]
+
+
+# httpx clients are bound to the loop that created them, so keep one downloader per loop
+_DOWNLOADERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncFileDownloader]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_downloader() -> AsyncFileDownloader:
+    """Get the shared downloader for the running event loop"""
+    loop = asyncio.get_running_loop()
+    downloader = _DOWNLOADERS.get(loop)
+    if downloader is None:
+        downloader = AsyncFileDownloader(timeout=30)
+        _DOWNLOADERS[loop] = downloader
+    return downloader
+
+
+# Blocking callers share one keep-alive client instead of a new event loop (and
+# per-loop downloader) per call; httpx.Client is safe to use from several threads
+_SYNC_CLIENT: Optional[httpx.Client] = None
+_SYNC_CLIENT_LOCK = threading.Lock()
+
+
+def _get_sync_client() -> httpx.Client:
+    """Get the shared client for download_image_sync"""
+    global _SYNC_CLIENT
+    with _SYNC_CLIENT_LOCK:
+        if _SYNC_CLIENT is None:
+            _SYNC_CLIENT = httpx.Client(
+                timeout=httpx.Timeout(30, connect=20),
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+                trust_env=False,
+            )
+        return _SYNC_CLIENT
+
+
+async def aclose_all() -> None:
+    """Close the shared download clients (call on application shutdown)"""
+    global _SYNC_CLIENT
+    with _SYNC_CLIENT_LOCK:
+        client, _SYNC_CLIENT = _SYNC_CLIENT, None
+    if client is not None:
+        client.close()
+
+    current = asyncio.get_running_loop()
+    downloaders = list(_DOWNLOADERS.items())
+    _DOWNLOADERS.clear()
+    for loop, downloader in downloaders:
+        try:
+            if loop is current:
+                await downloader.close()
+            elif loop.is_running():
+                # httpx clients must be closed on the loop that created them
+                asyncio.run_coroutine_threadsafe(downloader.close(), loop)
+            # A closed loop already dropped the client's connections
+        except Exception as e:
+            logger.warning(f"Error closing downloader: {e}")
+
+
+_CACHE_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def _cache_ttl(headers: httpx.Headers, max_ttl: float) -> Optional[float]:
+    """Cache lifetime allowed by the response's Cache-Control (None: don't store)
+
+    Only an explicit max-age makes an entry fresh. Without one (our own R2 uploads
+    set no Cache-Control and reuse keys by position) the entry is stored already
+    stale, so the next call revalidates by ETag instead of trusting old bytes.
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    match = _CACHE_MAX_AGE_RE.search(cache_control)
+    if match:
+        return min(float(match.group(1)), max_ttl)
+    return 0.0
+
+
+def _decode_data_url(url: str) -> bytes:
+    """Decode a data: URL: base64 (C decoder, no intermediate substrings) or percent-encoded"""
+    comma = url.index(",")
+    if url.endswith(";base64", 0, comma):
+        return binascii.a2b_base64(url[comma + 1:])
+    return unquote_to_bytes(url[comma + 1:])
+
+
+def _revalidation_headers(cached: Optional[bytes], etag: Optional[str]) -> Optional[Dict[str, str]]:
+    """If-None-Match for a stale cache entry that has an ETag"""
+    return {"If-None-Match": etag} if cached is not None and etag else None
+
+
+def _cache_download(url: str, response: httpx.Response, cached: Optional[bytes], etag: Optional[str]) -> bytes:
+    """Resolve a (possibly conditional) download against the cache and store the result"""
+    ttl = _cache_ttl(response.headers, _DOWNLOAD_CACHE.max_ttl)
+    if response.status_code == 304 and cached is not None:
+        if ttl is not None:
+            _DOWNLOAD_CACHE.put(url, cached, ttl, response.headers.get("etag", etag))
+        return cached
+
+    response.raise_for_status()
+    data = response.content
+    if ttl is not None:
+        _DOWNLOAD_CACHE.put(url, data, ttl, response.headers.get("etag"))
+    return data
+
+
+class _DownloadCache:
+    """TTL LRU of downloaded image bytes keyed by URL, deduplicated by content
+
+    URLs that serve identical bytes share one stored copy (keyed by SHA-256), so
+    the byte budget counts each distinct image once. Expired entries that carry an
+    ETag are kept for conditional revalidation (If-None-Match / 304).
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 256 * 1024 * 1024,
+                 max_ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Upper bound on a response's max-age
+        self.max_ttl = max_ttl
+        # url -> (content digest, expires_at, etag)
+        self._entries: "OrderedDict[str, Tuple[str, float, Optional[str]]]" = OrderedDict()
+        # content digest -> [data, number of URLs referencing it]
+        self._blobs: Dict[str, list] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Tuple[Optional[bytes], Optional[str], bool]:
+        """Look up a URL
+
+        Returns:
+            Tuple of (cached bytes or None, etag, whether the entry is still fresh)
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None, None, False
+            digest, expires_at, etag = entry
+            self._entries.move_to_end(url)
+            return self._blobs[digest][0], etag, time.monotonic() < expires_at
+
+    def put(self, url: str, data: bytes, ttl: float, etag: Optional[str]) -> None:
+        """Store (or refresh) a URL's bytes for ttl seconds"""
+        if len(data) > self.max_bytes:
+            return
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._drop(url)
+            blob = self._blobs.get(digest)
+            if blob is None:
+                self._blobs[digest] = [data, 1]
+                self._bytes += len(data)
+            else:
+                blob[1] += 1
+            self._entries[url] = (digest, time.monotonic() + ttl, etag)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, url: str) -> None:
+        """Remove a URL entry, freeing its bytes when no other URL shares them"""
+        entry = self._entries.pop(url, None)
+        if entry is None:
+            return
+        blob = self._blobs[entry[0]]
+        blob[1] -= 1
+        if blob[1] == 0:
+            del self._blobs[entry[0]]
+            self._bytes -= len(blob[0])
+
+
+_DOWNLOAD_CACHE = _DownloadCache()
+
+
+_PROCESS_POOL: Optional[ProcessPoolExecutor] = None
+_PROCESS_POOL_WORKERS = 0
+_PROCESS_POOL_LOCK = threading.Lock()
+# The pool is created lazily inside a process already running queue workers and
+# client threads; fork() would copy their held locks into the children.
+_PROCESS_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _warm_worker() -> None:
+    """No-op task used to start pool workers ahead of the first batch"""
+
+
+def _get_process_pool(max_workers: Optional[int] = None) -> Tuple[ProcessPoolExecutor, int]:
+    """Get the shared CPU process pool and its size (created and pre-warmed lazily)
+
+    Args:
+        max_workers: Pool size used when the pool is first created (default: CPU count)
+    """
+    global _PROCESS_POOL, _PROCESS_POOL_WORKERS
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is None:
+            _PROCESS_POOL_WORKERS = max_workers or os.cpu_count() or 1
+            _PROCESS_POOL = ProcessPoolExecutor(
+                max_workers=_PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context(_PROCESS_POOL_START_METHOD)
+            )
+            for _ in range(_PROCESS_POOL_WORKERS):
+                _PROCESS_POOL.submit(_warm_worker)
+        return _PROCESS_POOL, _PROCESS_POOL_WORKERS
+
 
 class AiImageProcessor:
     """Core AI image processing service"""
@@ -34,6 +575,9 @@ class AiImageProcessor:
                 - target_width: Default target width
                 - target_height: Default target height
                 - default_temperature: Default temperature for generation
+                - response_cache_size: Max cached background-replacement results (0 disables)
+                - webp_method: WebP encoder effort 0-6 (speed vs size, default 4)
+                - process_pool_workers: Bulk-optimization process count (default: CPU count)
         """
         self.api_base = config.get("api_base", "")
         self.api_key = config.get("api_key", "")
@@ -41,6 +585,50 @@ class AiImageProcessor:
         self.target_width = config.get("target_width", 1500)
         self.target_height = config.get("target_height", 2000)
         self.default_temperature = config.get("default_temperature", 0.5)
+        self.webp_method = int(config.get("webp_method", 4))
+        self.process_pool_workers = config.get("process_pool_workers") or None
+
+        # Exact-match cache of LLM results keyed by (image hash, prompt, temperature)
+        self._response_cache_size = int(config.get("response_cache_size", 64) or 0)
+        self._response_cache: "OrderedDict[str, Tuple[bytes, Dict[str, Any]]]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+
+    @staticmethod
+    def shutdown() -> None:
+        """Shut down the shared process pool (call on application shutdown)"""
+        global _PROCESS_POOL, _PROCESS_POOL_WORKERS
+        with _PROCESS_POOL_LOCK:
+            pool, _PROCESS_POOL = _PROCESS_POOL, None
+            _PROCESS_POOL_WORKERS = 0
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _response_cache_key(self, image_data: bytes, prompt: str, temperature: float) -> str:
+        """Build the exact-match response cache key"""
+        h = hashlib.sha256(image_data)
+        h.update(b"\0")
+        h.update(f"{self.model}\0{prompt}\0{float(temperature)!r}".encode("utf-8"))
+        return h.hexdigest()
+
+    def _response_cache_get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Look up a cached result (refreshes LRU position)"""
+        with self._response_cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is None:
+                return None
+            self._response_cache.move_to_end(key)
+            result_bytes, metadata = entry
+            return result_bytes, dict(metadata)
+
+    def _response_cache_put(self, key: str, result_bytes: bytes, metadata: Dict[str, Any]) -> None:
+        """Store a result, evicting least recently used entries"""
+        if self._response_cache_size <= 0:
+            return
+        with self._response_cache_lock:
+            self._response_cache[key] = (result_bytes, dict(metadata))
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self._response_cache_size:
+                self._response_cache.popitem(last=False)
 
     async def process_background_replacement(
         self,
@@ -48,7 +636,8 @@ class AiImageProcessor:
         background_prompt: str,
         negative_prompt: str = "",
         temperature: float = 0.5,
-        cancel_check: Optional[callable] = None
+        cancel_check: Optional[callable] = None,
+        cache_check: bool = False
     ) -> Tuple[bytes, Dict[str, Any]]:
         """Process background replacement using AI
 
@@ -58,6 +647,9 @@ class AiImageProcessor:
             negative_prompt: Things to avoid in the background
             temperature: Generation temperature (0-1)
             cancel_check: Optional callable to check for cancellation
+            cache_check: Reuse (and store) a cached result for an identical (image, prompt,
+                temperature). Off by default: generation is sampled, so a re-run is
+                expected to produce a new image
 
         Returns:
             Tuple of (result_image_bytes, metadata)
@@ -73,20 +665,26 @@ class AiImageProcessor:
         if not self.api_key or not self.api_base or not self.model:
             raise ValueError("AI API configuration is incomplete")
 
-        # Load image
-        image = Image.open(io.BytesIO(image_data))
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-
-        original_width, original_height = image.size
-
         # Build prompt
         extra_prompt = f"Background: {background_prompt}"
         if negative_prompt:
             extra_prompt += f". Negative: {negative_prompt}"
 
+        cache_key = None
+        if cache_check and self._response_cache_size > 0:
+            cache_key = self._response_cache_key(image_data, extra_prompt, temperature)
+            cached = self._response_cache_get(cache_key)
+            if cached is not None:
+                logger.info("Background replacement served from response cache")
+                return cached
+
+        # Load image (decode off the event loop)
+        image = await asyncio.to_thread(_open_rgb, image_data)
+
+        original_width, original_height = image.size
+
         # Call external LLM API for image generation
-        result_image = await self._call_ai_image_api(
+        result_image, raw_result_bytes = await self._call_ai_image_api(
             image=image,
             prompt=extra_prompt,
             temperature=temperature,
@@ -101,10 +699,14 @@ class AiImageProcessor:
             "background_prompt": background_prompt,
         }
 
-        # Convert result to bytes
-        output = io.BytesIO()
-        result_image.save(output, format="PNG")
-        result_bytes = output.getvalue()
+        # Convert result to bytes (pass the API's bytes through when they are already PNG)
+        if result_image.format == "PNG":
+            result_bytes = raw_result_bytes
+        else:
+            result_bytes = await asyncio.to_thread(_encode_png, result_image)
+
+        if cache_key is not None:
+            self._response_cache_put(cache_key, result_bytes, metadata)
 
         return result_bytes, metadata
 
@@ -115,17 +717,20 @@ class AiImageProcessor:
         output_format: str = "webp",
         max_size: int = 1920,
         maintain_aspect: bool = True,
-        cancel_check: Optional[callable] = None
+        cancel_check: Optional[callable] = None,
+        resample_strategy: str = "auto"
     ) -> Tuple[bytes, Dict[str, Any]]:
         """Process batch optimization (compression and resizing)
 
         Args:
             image_data: Source image bytes
-            quality: Quality level (low, standard, high)
-            output_format: Output format (png, jpg, webp)
+            quality: Quality level (low, standard, high, or auto to pick from image detail)
+            output_format: Output format (png, jpg, webp, or auto: png for few-color
+                images, webp otherwise)
             max_size: Maximum dimension
             maintain_aspect: Whether to maintain aspect ratio
             cancel_check: Optional callable to check for cancellation
+            resample_strategy: "auto" (scale-dependent) or "lanczos"
 
         Returns:
             Tuple of (optimized_image_bytes, metadata)
@@ -133,48 +738,54 @@ class AiImageProcessor:
         if cancel_check:
             cancel_check()
 
-        image = Image.open(io.BytesIO(image_data))
-        original_size = len(image_data)
-        original_width, original_height = image.size
-
-        # Determine quality values
-        quality_map = {"low": 70, "standard": 85, "high": 95}
-        jpeg_quality = quality_map.get(quality, 85)
-
-        # Resize if needed
-        if max_size and (image.width > max_size or image.height > max_size):
-            if maintain_aspect:
-                image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            else:
-                image = image.resize((max_size, max_size), Image.Resampling.LANCZOS)
-
-        # Determine format
-        format_map = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
-        pil_format = format_map.get(output_format.lower(), "PNG")
+        return await asyncio.to_thread(
+            _optimize_image,
+            image_data, quality, output_format, max_size, maintain_aspect, self.webp_method,
+            resample_strategy
+        )
 
-        # Save with optimization
-        output = io.BytesIO()
-        save_kwargs = {}
-        if pil_format in ("JPEG", "WEBP"):
-            save_kwargs["quality"] = jpeg_quality
-            save_kwargs["optimize"] = True
+    async def process_batch_optimization_bulk(
+        self,
+        images: List[bytes],
+        quality: str = "standard",
+        output_format: str = "webp",
+        max_size: int = 1920,
+        maintain_aspect: bool = True,
+        resample_strategy: str = "auto"
+    ) -> List[Tuple[bytes, Dict[str, Any]]]:
+        """Optimize many images in parallel across the CPU process pool
 
-        image.save(output, format=pil_format, **save_kwargs)
-        result_bytes = output.getvalue()
+        Images are split into chunks so each pool task loops internally, amortizing
+        the per-task pickling and scheduling overhead.
 
-        metadata = {
-            "original_width": original_width,
-            "original_height": original_height,
-            "result_width": image.width,
-            "result_height": image.height,
-            "original_size": original_size,
-            "result_size": len(result_bytes),
-            "compression_ratio": round(1 - len(result_bytes) / original_size, 2),
-            "quality": quality,
-            "format": output_format,
-        }
+        Args:
+            images: Source image bytes
+            quality: Quality level (low, standard, high)
+            output_format: Output format (png, jpg, webp)
+            max_size: Maximum dimension
+            maintain_aspect: Whether to maintain aspect ratio
+            resample_strategy: "auto" (scale-dependent) or "lanczos"
 
-        return result_bytes, metadata
+        Returns:
+            List of (optimized_image_bytes, metadata) in input order
+        """
+        if not images:
+            return []
+
+        pool, workers = _get_process_pool(self.process_pool_workers)
+        chunksize = max(1, len(images) // (4 * workers))
+        chunks = [images[i:i + chunksize] for i in range(0, len(images), chunksize)]
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(
+                pool, _optimize_chunk,
+                chunk, quality, output_format, max_size, maintain_aspect, self.webp_method,
+                resample_strategy
+            )
+            for chunk in chunks
+        ])
+        return [item for chunk_result in results for item in chunk_result]
 
     async def process_image_enhancement(
         self,
@@ -183,7 +794,8 @@ class AiImageProcessor:
         sharpen: bool = True,
         denoise: bool = True,
         upscale: bool = False,
-        cancel_check: Optional[callable] = None
+        cancel_check: Optional[callable] = None,
+        resample_strategy: str = "auto"
     ) -> Tuple[bytes, Dict[str, Any]]:
         """Process image enhancement
 
@@ -194,6 +806,7 @@ class AiImageProcessor:
             denoise: Whether to apply denoising
             upscale: Whether to upscale 2x
             cancel_check: Optional callable to check for cancellation
+            resample_strategy: "auto" (bicubic for the 2x upscale) or "lanczos"
 
         Returns:
             Tuple of (enhanced_image_bytes, metadata)
@@ -201,36 +814,57 @@ class AiImageProcessor:
         if cancel_check:
             cancel_check()
 
+        return await asyncio.to_thread(
+            self._image_enhancement_sync,
+            image_data, enhancement_level, sharpen, denoise, upscale, cancel_check,
+            resample_strategy
+        )
+
+    def _image_enhancement_sync(
+        self,
+        image_data: bytes,
+        enhancement_level: int,
+        sharpen: bool,
+        denoise: bool,
+        upscale: bool,
+        cancel_check: Optional[callable] = None,
+        resample_strategy: str = "auto"
+    ) -> Tuple[bytes, Dict[str, Any]]:
+        """CPU-bound body of process_image_enhancement (runs in a worker thread)"""
         image = Image.open(io.BytesIO(image_data))
-        if image.mode != "RGB":
+        # RGB and L are processed as-is; RGBA keeps its alpha, which is split off so
+        # the filters and LUT only touch color and then re-attached unchanged
+        alpha = None
+        if image.mode == "RGBA":
+            alpha = image.getchannel("A")
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "L"):
             image = image.convert("RGB")
 
         original_width, original_height = image.size
 
-        # Apply sharpening
-        if sharpen:
+        # Apply sharpening and/or denoising (smooth); both together are one 5x5 pass
+        if sharpen and denoise:
+            image = image.filter(_SHARPEN_SMOOTH)
+            if cancel_check:
+                cancel_check()
+        elif sharpen:
             image = image.filter(ImageFilter.SHARPEN)
             if cancel_check:
                 cancel_check()
-
-        # Apply denoising (smooth)
-        if denoise:
+        elif denoise:
             image = image.filter(ImageFilter.SMOOTH)
             if cancel_check:
                 cancel_check()
 
         # Adjust contrast based on enhancement level
+        # (contrast and the slight brightness lift are fused into one LUT pass)
         if enhancement_level > 0:
-            enhancer = ImageEnhance.Contrast(image)
             contrast_factor = 1.0 + (enhancement_level * 0.05)
-            image = enhancer.enhance(contrast_factor)
-            if cancel_check:
-                cancel_check()
-
-            # Adjust brightness slightly
-            enhancer = ImageEnhance.Brightness(image)
             brightness_factor = 1.0 + (enhancement_level * 0.03)
-            image = enhancer.enhance(brightness_factor)
+            mean = int(_luma_mean(image) + 0.5)
+            lut = _contrast_brightness_lut(mean, contrast_factor, brightness_factor)
+            image = image.point(lut * len(image.getbands()))
             if cancel_check:
                 cancel_check()
 
@@ -238,11 +872,14 @@ class AiImageProcessor:
         if upscale:
             new_width = image.width * 2
             new_height = image.height * 2
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            image = _resize(image, (new_width, new_height), resample_strategy)
+            if alpha is not None:
+                alpha = _resize(alpha, (new_width, new_height), resample_strategy)
 
-        output = io.BytesIO()
-        image.save(output, format="PNG")
-        result_bytes = output.getvalue()
+        if alpha is not None:
+            image.putalpha(alpha)
+
+        result_bytes = _save_to_bytes(image, format="PNG")
 
         metadata = {
             "original_width": original_width,
@@ -263,7 +900,7 @@ class AiImageProcessor:
         prompt: str,
         temperature: float,
         cancel_check: Optional[callable] = None
-    ) -> Image.Image:
+    ) -> Tuple[Image.Image, bytes]:
         """Call external LLM API for image generation/editing
 
         Args:
@@ -273,31 +910,21 @@ class AiImageProcessor:
             cancel_check: Optional callable to check for cancellation
 
         Returns:
-            Processed PIL Image
+            Tuple of (processed PIL Image (lazily decoded), raw image bytes from the API)
 
         Raises:
             requests.RequestException: If API call fails
         """
-        # Encode image to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        image_bytes = buffered.getvalue()
-        base64_image = base64.b64encode(image_bytes).decode("utf-8")
+        # Encode image to base64 (kept as bytes; PNG is lossless at any level, so favour speed)
+        base64_image = await asyncio.to_thread(_encode_png_base64, image)
 
         # Build API request
         url = f"{self.api_base.rstrip('/')}/{self.model}:generateContent"
 
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {"inlineData": {"mimeType": "image/png", "data": base64_image}},
-                        {"text": prompt}
-                    ]
-                }
-            ],
-            "generationConfig": {"temperature": temperature}
-        }
+        # Splice the base64 bytes into the pre-built envelope so the multi-MB string
+        # is never round-tripped through str/json
+        body = _build_request_body(base64_image, prompt, temperature)
+        del base64_image
 
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -307,14 +934,14 @@ class AiImageProcessor:
         if cancel_check:
             cancel_check()
 
-        # Make API call
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers, timeout=300) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise requests.RequestException(f"API error {response.status}: {error_text}")
+        # Make API call (shared keep-alive HTTP/2 pool, multiplexed per host)
+        client = await HttpClient.get_session()
+        response = await client.post(url, content=body, headers=headers, timeout=_API_TIMEOUT)
+        if response.status_code != 200:
+            raise requests.RequestException(f"API error {response.status_code}: {response.text}")
 
-                data = await response.json()
+        # Multi-MB JSON (base64 image); orjson parses it straight from bytes
+        data = orjson.loads(response.content)
 
         if cancel_check:
             cancel_check()
@@ -341,15 +968,18 @@ class AiImageProcessor:
         for part in parts:
             result_base64 = _extract_inline_data(part)
             if result_base64:
-                result_bytes = base64.b64decode(result_base64)
-                return Image.open(io.BytesIO(result_bytes))
+                result_bytes = await asyncio.to_thread(base64.b64decode, result_base64)
+                return Image.open(io.BytesIO(result_bytes)), result_bytes
 
         raise ValueError("No image data in API response")
 
-    @staticmethod
-    def download_image(url: str) -> bytes:
+    @classmethod
+    async def download_image(cls, url: str) -> bytes:
         """Download image from URL
 
+        HTTP(S) URLs go through a shared keep-alive httpx client (one per event loop)
+        and a process-wide cache that honours Cache-Control and revalidates by ETag.
+
         Args:
             url: Image URL (http, https, or data: base64)
 
@@ -360,18 +990,41 @@ class AiImageProcessor:
             ValueError: If URL is invalid or download fails
         """
         if url.startswith("data:image"):
-            # Base64 encoded image
-            header, data = url.split(",", 1)
-            return base64.b64decode(data)
+            return _decode_data_url(url)
 
         elif url.startswith("http://") or url.startswith("https://"):
-            # URL image - download synchronously
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
+            # URL image - serve from cache while fresh, else download over the shared client
+            cached, etag, fresh = _DOWNLOAD_CACHE.get(url)
+            if fresh:
+                return cached
+            response = await _get_downloader().fetch(url, headers=_revalidation_headers(cached, etag))
+            return _cache_download(url, response, cached, etag)
 
         else:
             # Local file path
+            path = Path(url)
+            if not path.exists():
+                raise FileNotFoundError(f"Image not found: {url}")
+            async with aiofiles.open(path, "rb") as f:
+                return await f.read()
+
+    @classmethod
+    def download_image_sync(cls, url: str) -> bytes:
+        """Blocking counterpart of download_image for callers without an event loop
+
+        Uses a shared httpx.Client and the same download cache.
+        """
+        if url.startswith("data:image"):
+            return _decode_data_url(url)
+
+        elif url.startswith("http://") or url.startswith("https://"):
+            cached, etag, fresh = _DOWNLOAD_CACHE.get(url)
+            if fresh:
+                return cached
+            response = _get_sync_client().get(url, headers=_revalidation_headers(cached, etag))
+            return _cache_download(url, response, cached, etag)
+
+        else:
             path = Path(url)
             if not path.exists():
                 raise FileNotFoundError(f"Image not found: {url}")
@@ -7,6 +7,10 @@ from pathlib import Path
 
 import httpx
 
+# Downloads are read and written in 1 MB chunks; progress is reported every 64 KB
+WRITE_BUFFER_SIZE = 1024 * 1024
+PROGRESS_STEP = 64 * 1024
+
 
 class AsyncRateLimiter:
     """Rate limiter using asyncio.Semaphore."""
@@ -58,6 +62,20 @@ class AsyncFileDownloader:
             )
         return self._client
 
+    async def fetch(self, url: str, headers: Optional[dict] = None) -> httpx.Response:
+        """
+        GET a URL into memory over the shared client (no retries).
+
+        Args:
+            url: Source URL
+            headers: Optional extra request headers
+
+        Returns:
+            Response with the body read
+        """
+        client = await self._get_client()
+        return await client.get(url, headers=headers)
+
     async def download(
         self,
         url: str,
@@ -86,11 +104,22 @@ class AsyncFileDownloader:
                     import aiofiles
                     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+                    # aiter_bytes already yields ~WRITE_BUFFER_SIZE chunks, so each is
+                    # written as-is (one executor hop per chunk). The file is buffered:
+                    # BufferedWriter.write retries short writes, so chunks are never
+                    # truncated, and large chunks bypass its buffer without a copy.
+                    # Progress is reported at most every PROGRESS_STEP bytes.
+                    pending_progress = 0
                     async with aiofiles.open(output_path, 'wb') as f:
-                        async for chunk in response.aiter_bytes(chunk_size=8192):
+                        async for chunk in response.aiter_bytes(chunk_size=WRITE_BUFFER_SIZE):
                             await f.write(chunk)
                             if progress_callback:
-                                await progress_callback(len(chunk))
+                                pending_progress += len(chunk)
+                                if pending_progress >= PROGRESS_STEP:
+                                    await progress_callback(pending_progress)
+                                    pending_progress = 0
+                    if progress_callback and pending_progress:
+                        await progress_callback(pending_progress)
 
                 return
 
@@ -1,33 +1,56 @@
 """HTTP client connection pool management"""
 
-from typing import Optional
-import aiohttp
-from aiohttp import ClientSession
+import asyncio
+import weakref
+
+import httpx
 
 
 class HttpClient:
-    """HTTP client connection pool manager"""
+    """HTTP client connection pool manager
+
+    httpx clients are bound to the event loop that created them, so one pooled
+    HTTP/2 client is kept per running loop (the main ASGI loop, job-worker loops,
+    test loops) and dropped automatically when its loop is garbage collected.
+    """
 
-    _session: Optional[ClientSession] = None
+    _clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+        weakref.WeakKeyDictionary()
+    )
 
     @classmethod
-    async def get_session(cls) -> ClientSession:
-        """Get shared HTTP session"""
-        if cls._session is None:
-            timeout = aiohttp.ClientTimeout(total=30)
-            connector = aiohttp.TCPConnector(
-                limit=100,           # Total connections
-                limit_per_host=10    # Max connections per host
+    async def get_session(cls) -> httpx.AsyncClient:
+        """Get shared HTTP client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = cls._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=True,
+                timeout=httpx.Timeout(30, connect=20),
+                limits=httpx.Limits(
+                    max_connections=100,          # Total connections
+                    max_keepalive_connections=20
+                ),
+                # Retries connection failures (connect errors/resets), not HTTP status codes
+                transport=httpx.AsyncHTTPTransport(http2=True, retries=2),
+                trust_env=False
             )
-            cls._session = ClientSession(
-                timeout=timeout,
-                connector=connector
-            )
-        return cls._session
+            cls._clients[loop] = client
+        return client
 
     @classmethod
     async def close(cls):
-        """Close connection pool"""
-        if cls._session:
-            await cls._session.close()
-            cls._session = None
+        """Close connection pools
+
+        Clients owned by the running loop are closed; clients of other loops cannot
+        be awaited here and are simply released.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        clients = list(cls._clients.items())
+        cls._clients.clear()
+        for owner, client in clients:
+            if owner is loop:
+                await client.aclose()
@@ -1,23 +1,95 @@
 from __future__ import annotations
 
 import asyncio
-import base64
+import binascii
+import hashlib
 import io
+import multiprocessing
+import os
 import tempfile
 import time
 import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Iterable, Optional, Sequence
+from typing import Optional, Sequence
 
 import httpx
+import numpy as np
+import orjson
 from PIL import Image, ImageFilter
 
+# SIMD (AVX2/SSSE3/NEON) base64 codec when installed; same API as the stdlib module
+try:
+    import pybase64 as base64
+    _PYBASE64 = True
+except ImportError:
+    import base64
+    _PYBASE64 = False
+
 from app.services.image_studio_queue import CancelledError
 from app.services.async_utils import AsyncFileDownloader, AsyncRateLimiter
 
+# Output suffix -> PIL format, for storing model output bytes without re-encoding
+_SUFFIX_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".png": "PNG"}
+
+# Every output suffix Pillow can write -> PIL format (save() needs it explicitly when
+# the destination is a BytesIO, which has no filename to infer it from)
+_WRITABLE_SUFFIX_FORMATS = {
+    ext: fmt for ext, fmt in Image.registered_extensions().items() if fmt in Image.SAVE
+}
+
+
+def is_supported_output_format(output_format: str) -> bool:
+    """Whether results can be saved as output_format (e.g. "png", "jpg", "webp")"""
+    return f".{str(output_format).lower().lstrip('.')}" in _WRITABLE_SUFFIX_FORMATS
+
+# Images encoded for the model (main and references) are baseline JPEG: with
+# libjpeg-turbo it encodes several times faster than WebP, and the model input
+# does not need to be lossless or minimal in size
+MODEL_IMAGE_FORMAT = "JPEG"
+MODEL_IMAGE_MIME = "image/jpeg"
+MODEL_IMAGE_QUALITY = 92
+
+# libwebp encoder effort (0-6). 6 is roughly twice as slow as 4 for a ~1-2% size
+# gain on photos, and every encode here sits on the request/response latency path.
+WEBP_METHOD = 4
+
+
+def _resize(img: Image.Image, size, box=None) -> Image.Image:
+    """LANCZOS resize; large downscales first box-reduce by an integer factor.
+
+    reducing_gap=3.0 lets Pillow shrink by a cheap integer box reduce until the
+    image is within 3x of the target, then LANCZOS the rest; per Pillow's docs the
+    result is practically indistinguishable from a full LANCZOS resample.
+
+    Args:
+        img: Source image
+        size: Target (width, height)
+        box: Optional source region (left, top, right, bottom) to resample from
+    """
+    src_w = (box[2] - box[0]) if box else img.width
+    src_h = (box[3] - box[1]) if box else img.height
+    if size[0] < src_w and size[1] < src_h:
+        return img.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+    return img.resize(size, Image.LANCZOS, box=box)
+
+
+def _area_resize(img: Image.Image, size) -> Image.Image:
+    """Area-average resize for model inputs (PIL's counterpart of cv2 INTER_AREA).
+
+    Shrinking by 2x or more on both axes uses a single BOX pass, which averages
+    each output pixel's source area with no ringing and costs a fraction of
+    LANCZOS; milder changes go through _resize. Final outputs keep _resize.
+    """
+    if size[0] * 2 <= img.width and size[1] * 2 <= img.height:
+        return img.resize(size, Image.BOX)
+    return _resize(img, size)
+
 
 def encode_image_for_model(img: Image.Image, max_long_side: int = 1600) -> str:
-    """Encode image to base64 using WebP for better compression."""
+    """Encode image to base64 as a model-input JPEG."""
     if img.mode != "RGB":
         img = img.convert("RGB")
     w, h = img.size
@@ -26,84 +98,176 @@ def encode_image_for_model(img: Image.Image, max_long_side: int = 1600) -> str:
         scale = max_long_side / float(long_side)
         nw = max(1, int(round(w * scale)))
         nh = max(1, int(round(h * scale)))
-        img = img.resize((nw, nh), Image.LANCZOS)
+        img = _area_resize(img, (nw, nh))
     buffer = io.BytesIO()
-    # Use WebP for better compression (50-70% smaller than PNG)
-    img.save(buffer, format="WEBP", quality=85, method=6)
-    image_bytes = buffer.getvalue()
-    return base64.b64encode(image_bytes).decode("utf-8")
+    img.save(buffer, format=MODEL_IMAGE_FORMAT, quality=MODEL_IMAGE_QUALITY)
+    # base64 reads the buffer in place (no getvalue() copy)
+    return base64.b64encode(buffer.getbuffer()).decode("ascii")
+
+
+def _encode_request_image(img: Image.Image, max_bytes: int = 0) -> memoryview:
+    """Encode the model input as JPEG, shrinking it only if a byte budget is set.
+
+    With no budget (the default) this is a single encode. With a budget the image
+    is downscaled by the estimated area ratio and re-encoded, at most 5 times.
+    One BytesIO is reused across attempts and its contents are returned as a
+    zero-copy view.
+    """
+    buffer = io.BytesIO()
+
+    def encode(im: Image.Image) -> int:
+        buffer.seek(0)
+        buffer.truncate(0)
+        im.save(buffer, format=MODEL_IMAGE_FORMAT, quality=MODEL_IMAGE_QUALITY)
+        return buffer.tell()
+
+    size = encode(img)
+    if max_bytes:
+        for _ in range(5):
+            if size <= max_bytes:
+                break
+            w1, h1 = img.size
+            if max(w1, h1) <= 256:
+                break
+            ratio = (max_bytes / float(size)) ** 0.5
+            ratio = max(0.5, min(0.95, ratio * 0.95))
+            nw1 = max(1, int(round(w1 * ratio)))
+            nh1 = max(1, int(round(h1 * ratio)))
+            if nw1 == w1 and nh1 == h1:
+                break
+            img = _area_resize(img, (nw1, nh1))
+            size = encode(img)
+    return buffer.getbuffer()
+
+
+def _tinted_blur_background(img: Image.Image, size, bg_color, radius: float = 25.0,
+                            tint: float = 0.4) -> Image.Image:
+    """Blurred copy of img stretched to size, blended toward bg_color by tint.
+
+    A large-radius blur leaves no fine detail, so it runs on a copy downscaled by
+    up to 8x (keeping at least a 3 px radius and 50 px short side) and the result
+    is upsampled; a radius-25 blur then touches 1/64th of the pixels. Pillow's
+    GaussianBlur is itself three separable running-sum box passes (O(1) per
+    pixel regardless of radius), so no hand-rolled BoxBlur chain is needed. The blend
+    with a solid color is a per-channel affine map, applied as one Image.point
+    LUT on the small image (it commutes with the bilinear upsample) instead of
+    allocating a color layer for Image.blend.
+    """
+    canvas_w, canvas_h = size
+    factor = 1
+    for f in (8, 4, 2):
+        if radius / f >= 3 and min(canvas_w, canvas_h) // f >= 50:
+            factor = f
+            break
+    small = img.resize((max(1, canvas_w // factor), max(1, canvas_h // factor)), Image.BOX)
+    blurred = small.filter(ImageFilter.GaussianBlur(radius=radius / factor))
+    lut = []
+    for c in bg_color:
+        lut.extend(int(v + tint * (c - v)) for v in range(256))
+    blurred = blurred.point(lut)
+    if factor > 1:
+        blurred = blurred.resize((canvas_w, canvas_h), Image.BILINEAR)
+    return blurred
+
+
+def _scan_white_bounds(arr: np.ndarray, stride: int, thr: int, ratio_thr: float):
+    """Count near-white lines at each edge of an RGB array.
+
+    A row counts as white when at least ratio_thr of its pixels (sampled every
+    `stride` columns) have all channels >= thr; columns likewise, sampled every
+    `stride` rows. With stride 1 both counts reduce the same dense mask.
+
+    Runs on the <=420 px thumbnail, where the full-mask reductions take well
+    under a millisecond; an early-exit compiled loop would not pay for a JIT
+    dependency and its warm-up.
+
+    Returns:
+        (top, bottom, left, right) white-run lengths in pixels
+    """
+    mask = (arr >= thr).all(axis=2)
+    rows = mask[:, ::stride] if stride > 1 else mask
+    cols = mask[::stride, :] if stride > 1 else mask
+    row_white = np.count_nonzero(rows, axis=1) >= ratio_thr * rows.shape[1]
+    col_white = np.count_nonzero(cols, axis=0) >= ratio_thr * cols.shape[0]
+
+    def run_length(flags) -> int:
+        # Index of the first non-white line == length of the white run
+        return int(flags.argmin()) if not flags.all() else len(flags)
+
+    return (
+        run_length(row_white),
+        run_length(row_white[::-1]),
+        run_length(col_white),
+        run_length(col_white[::-1]),
+    )
+
+
+# Encoded reference images keyed by a hash of the file bytes: the same style
+# references are sent with every SKU of a batch (each downloaded to its own temp
+# path), so repeats skip the decode/resize/encode
+_REF_CACHE_MAX = 32
+_REF_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_REF_CACHE_LOCK = threading.Lock()
+
+# Shared by all calls, so concurrent SKUs do not each start their own threads
+_REF_ENCODE_POOL = ThreadPoolExecutor(thread_name_prefix="ref-encode")
+
+
+def _load_and_encode_ref(path: str) -> Optional[str]:
+    """Load a reference image and encode it for the model (None if unreadable)."""
+    try:
+        data = Path(path).read_bytes()
+        cache_key = hashlib.sha256(data).hexdigest()
+        with _REF_CACHE_LOCK:
+            cached = _REF_CACHE.get(cache_key)
+            if cached is not None:
+                _REF_CACHE.move_to_end(cache_key)
+                return cached
+
+        ref_img = Image.open(io.BytesIO(data))
+        # JPEG: decode at a reduced DCT scale when far above the 1200 px cap
+        ref_img.draft("RGB", (1200, 1200))
+        ref_img.load()
+        encoded = encode_image_for_model(ref_img, max_long_side=1200)
+
+        with _REF_CACHE_LOCK:
+            _REF_CACHE[cache_key] = encoded
+            while len(_REF_CACHE) > _REF_CACHE_MAX:
+                _REF_CACHE.popitem(last=False)
+        return encoded
+    except Exception:
+        return None
 
 
 def _maybe_crop_white_padding(img: Image.Image):
     if img is None:
         return img, None
     try:
-        base = img.convert("RGB") if img.mode != "RGB" else img
-        w0, h0 = base.size
+        # Decide on a <=420 px thumbnail; only that and (if cropping) the cropped
+        # region are converted to RGB, never the full-resolution image
+        w0, h0 = img.size
         if w0 < 80 or h0 < 80:
             return img, None
 
         max_dim = 420
         scale = min(max_dim / float(max(w0, h0)), 1.0)
         if scale < 1.0:
-            small = base.resize((max(1, int(w0 * scale)), max(1, int(h0 * scale))), Image.LANCZOS)
+            small = img.resize((max(1, int(w0 * scale)), max(1, int(h0 * scale))), Image.BOX)
         else:
-            small = base
+            small = img
+        if small.mode != "RGB":
+            small = small.convert("RGB")
         w, h = small.size
         if w < 40 or h < 40:
             return img, None
 
-        px = small.load()
-        stride = 2
+        # Dense: the mask is built for every pixel anyway, and contiguous row and
+        # column counts are cheaper than strided views of it
+        stride = 1
         white_thr = 245
         ratio_thr = 0.985
 
-        def is_white(rgb):
-            r, g, b = rgb
-            return r >= white_thr and g >= white_thr and b >= white_thr
-
-        def row_white_ratio(y: int) -> float:
-            total = 0
-            white = 0
-            for x in range(0, w, stride):
-                total += 1
-                if is_white(px[x, y]):
-                    white += 1
-            return (white / float(total)) if total else 0.0
-
-        def col_white_ratio(x: int) -> float:
-            total = 0
-            white = 0
-            for y in range(0, h, stride):
-                total += 1
-                if is_white(px[x, y]):
-                    white += 1
-            return (white / float(total)) if total else 0.0
-
-        top = 0
-        for y in range(h):
-            if row_white_ratio(y) >= ratio_thr:
-                top += 1
-            else:
-                break
-        bottom = 0
-        for y in range(h - 1, -1, -1):
-            if row_white_ratio(y) >= ratio_thr:
-                bottom += 1
-            else:
-                break
-        left = 0
-        for x in range(w):
-            if col_white_ratio(x) >= ratio_thr:
-                left += 1
-            else:
-                break
-        right = 0
-        for x in range(w - 1, -1, -1):
-            if col_white_ratio(x) >= ratio_thr:
-                right += 1
-            else:
-                break
+        top, bottom, left, right = _scan_white_bounds(np.asarray(small), stride, white_thr, ratio_thr)
 
         pad_h = top + bottom
         pad_w = left + right
@@ -142,8 +306,7 @@ def _maybe_crop_white_padding(img: Image.Image):
         x2 = max(x1 + 1, min(w0, x2))
         y2 = max(y1 + 1, min(h0, y2))
 
-        cropped = base.crop((x1, y1, x2, y2))
-        cw0, ch0 = cropped.size
+        cw0, ch0 = x2 - x1, y2 - y1
         if cw0 < 80 or ch0 < 80:
             return img, None
 
@@ -152,6 +315,10 @@ def _maybe_crop_white_padding(img: Image.Image):
         if abs(crop_ratio - 1.0) > 0.08 and abs(crop_ratio - 1.0) >= abs(orig_ratio - 1.0) * 0.7:
             return img, None
 
+        cropped = img.crop((x1, y1, x2, y2))
+        if cropped.mode != "RGB":
+            cropped = cropped.convert("RGB")
+
         return cropped, {"orig_size": (w0, h0), "cropped_size": (cw0, ch0), "box": (x1, y1, x2, y2)}
     except Exception:
         return img, None
@@ -162,32 +329,241 @@ def _check_cancel(cancel_event):
         raise CancelledError("Job cancelled")
 
 
-def _post_with_cancel(url: str, payload: dict, headers: dict, timeout: tuple, cancel_event):
-    # Use httpx with better connection handling and no proxy
-    limits = httpx.Limits(max_keepalive_connections=5, max_connections=10)
-    timeout_config = httpx.Timeout(timeout[1], connect=timeout[0])
+def _sleep_or_cancel(cancel_event, seconds):
+    # Backoff sleep that a cancel interrupts immediately instead of after `seconds`
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        raise CancelledError("Job cancelled")
+
+
+# How often a cancellable API call checks its job's cancel event (seconds); the
+# completion itself wakes the waiter immediately, so this only bounds cancel latency
+_CANCEL_POLL_INTERVAL = 0.05
+
+# Threads that carry cancellable model API calls (started on demand, then reused)
+_API_CALL_THREADS = 64
+_API_CALL_POOL = ThreadPoolExecutor(max_workers=_API_CALL_THREADS, thread_name_prefix="model-api")
+
+_api_client: Optional[httpx.Client] = None
+_api_client_lock = threading.Lock()
+
+
+def _new_api_client(max_connections: int = 20) -> httpx.Client:
+    """Create a keep-alive HTTP/2 client for model API calls (no proxy)."""
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=max_connections,
+            max_connections=max_connections,
+        ),
+        trust_env=False,
+    )
 
-    done = threading.Event()
-    box = {}
 
-    def _run():
+def _get_api_client() -> httpx.Client:
+    """Process-wide model API client, so calls reuse TCP+TLS connections."""
+    global _api_client
+    with _api_client_lock:
+        if _api_client is None or _api_client.is_closed:
+            _api_client = _new_api_client()
+        return _api_client
+
+
+def _b64decode_image(data: str) -> bytes:
+    """Decode a base64 image from a model response.
+
+    pybase64's strict (validate=True) decoder is its SIMD fast path; the lenient
+    default first filters out non-alphabet characters. Payloads that are not
+    strictly valid (e.g. with line breaks) fall back to the lenient decode.
+    """
+    if _PYBASE64:
         try:
-            with httpx.Client(limits=limits, timeout=timeout_config, trust_env=False) as client:
-                box["resp"] = client.post(url, json=payload, headers=headers)
-        except Exception as e:
-            box["err"] = e
-        finally:
-            done.set()
-
-    t = threading.Thread(target=_run, daemon=True)
-    t.start()
-    while not done.is_set():
-        if cancel_event is not None and cancel_event.is_set():
+            return base64.b64decode(data, validate=True)
+        except binascii.Error:
+            pass
+    return base64.b64decode(data)
+
+
+def _find_inline_image_data(result) -> Optional[str]:
+    """Return the first inline image base64 string in a generateContent response.
+
+    Accepts both the camelCase (inlineData) and snake_case (inline_data) keys.
+    """
+    candidates = result.get("candidates") if isinstance(result, dict) else None
+    for candidate in candidates or ():
+        if not isinstance(candidate, dict):
+            continue
+        for part in (candidate.get("content") or {}).get("parts") or ():
+            if not isinstance(part, dict):
+                continue
+            inline_data = part.get("inlineData") or part.get("inline_data")
+            if isinstance(inline_data, dict):
+                data_value = inline_data.get("data")
+                if data_value:
+                    return data_value
+    return None
+
+
+def _post_with_cancel(url: str, payload: dict, headers: dict, timeout: tuple, cancel_event,
+                      client: Optional[httpx.Client] = None):
+    # httpx.Client is thread-safe; the shared (or batch) client keeps connections warm
+    client = client or _get_api_client()
+    timeout_config = httpx.Timeout(timeout[1], connect=timeout[0])
+
+    # Serialize once with orjson (the payload carries the multi-MB base64 image)
+    body = orjson.dumps(payload)
+
+    # Nothing can cancel this call: post directly, no helper thread or polling
+    if cancel_event is None:
+        return client.post(url, content=body, headers=headers, timeout=timeout_config)
+
+    # The response only arrives once generation finishes, so a short read timeout
+    # cannot be used to poll; the post runs on a shared pool thread (no per-call
+    # thread start) while this thread watches the cancel flag
+    future = _API_CALL_POOL.submit(
+        client.post, url, content=body, headers=headers, timeout=timeout_config
+    )
+    while True:
+        if cancel_event.is_set():
+            future.cancel()
             raise CancelledError("Job cancelled")
-        done.wait(0.25)
-    if "err" in box:
-        raise box["err"]
-    return box.get("resp")
+        try:
+            return future.result(timeout=_CANCEL_POLL_INTERVAL)
+        except FutureTimeoutError:
+            continue
+
+
+# Model input: 3:4 aspect (within tolerance), long side capped
+REQUEST_ASPECT = 3.0 / 4.0
+REQUEST_MAX_LONG_SIDE = 1600
+_PASSTHROUGH_MIMES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def _passthrough_source(image_path) -> Optional[tuple]:
+    """Return (bytes, mime) if the source file can be sent to the model unchanged.
+
+    Only the header is read for the size/format checks; the white-padding check
+    decodes JPEGs at a reduced DCT scale. Returns None when the normal
+    crop/letterbox/resize/encode path is needed.
+    """
+    with Image.open(image_path) as probe:
+        w, h = probe.size
+        mime = _PASSTHROUGH_MIMES.get(probe.format)
+        if (
+            mime is None
+            or probe.mode != "RGB"
+            or h <= 0
+            or max(w, h) > REQUEST_MAX_LONG_SIDE
+            or abs(w / float(h) - REQUEST_ASPECT) > 0.005
+        ):
+            return None
+        if probe.format == "JPEG":
+            probe.draft("RGB", (420, 420))
+        probe.load()
+        _, crop_info = _maybe_crop_white_padding(probe)
+        if crop_info:
+            return None
+    return Path(str(image_path)).read_bytes(), mime
+
+
+def _letterbox_size(w: int, h: int):
+    """Smallest REQUEST_ASPECT canvas that contains a w x h image."""
+    if w / float(h) > REQUEST_ASPECT:
+        return w, max(1, int(round(w / REQUEST_ASPECT)))
+    return max(1, int(round(h * REQUEST_ASPECT))), h
+
+
+def _prepare_request_image(image_path, cancel_event) -> memoryview:
+    """Decode, crop white padding, letterbox to 3:4, cap size and JPEG-encode."""
+    img = Image.open(image_path)
+    # JPEG: decode at a reduced DCT scale when both sides are far above the cap
+    # (draft never goes below the requested size, so the later resize still applies)
+    img.draft("RGB", (REQUEST_MAX_LONG_SIDE, REQUEST_MAX_LONG_SIDE))
+    img.load()
+
+    cropped_img, crop_info = _maybe_crop_white_padding(img)
+    if crop_info:
+        img = cropped_img
+
+    _check_cancel(cancel_event)
+
+    send_img = img.convert("RGB") if img.mode != "RGB" else img
+    w0, h0 = send_img.size
+    if w0 > 0 and h0 > 0:
+        letterbox = abs(w0 / float(h0) - REQUEST_ASPECT) > 0.005
+
+        # Cap the long side of the final (letterboxed) frame before compositing,
+        # so the canvas, blur and paste all run at send resolution
+        frame_w, frame_h = _letterbox_size(w0, h0) if letterbox else (w0, h0)
+        long0 = max(frame_w, frame_h)
+        if long0 > REQUEST_MAX_LONG_SIDE:
+            scale0 = REQUEST_MAX_LONG_SIDE / float(long0)
+            nw0 = max(1, int(round(w0 * scale0)))
+            nh0 = max(1, int(round(h0 * scale0)))
+            send_img = _area_resize(send_img, (nw0, nh0))
+            w0, h0 = nw0, nh0
+
+        if letterbox:
+            canvas_w, canvas_h = _letterbox_size(w0, h0)
+            # Mean of corner/edge-midpoint samples (one vectorized gather). All six
+            # lie on the first/last row, so only those two rows become an array
+            # (np.asarray on the full image would copy every pixel).
+            edges = np.concatenate((
+                np.asarray(send_img.crop((0, 0, w0, 1))),
+                np.asarray(send_img.crop((0, h0 - 1, w0, h0))),
+            ))
+            ys = [0, 0, 1, 1, 0, 1]
+            xs = [0, w0 - 1, 0, w0 - 1, w0 // 2, w0 // 2]
+            bg_color = tuple(int(v) for v in edges[ys, xs].sum(axis=0) // len(ys))
+            canvas = _tinted_blur_background(send_img, (canvas_w, canvas_h), bg_color)
+            offset_x = (canvas_w - w0) // 2
+            offset_y = (canvas_h - h0) // 2
+            canvas.paste(send_img, (offset_x, offset_y))
+            send_img = canvas
+
+    # Single encode: no byte budget is applied to the model input
+    return _encode_request_image(send_img)
+
+
+def prepare_model_input(image_path) -> tuple:
+    """Build the (bytes, mime) model input for a source image file.
+
+    Top-level and returning plain bytes so it can run in a process pool.
+    """
+    passthrough = _passthrough_source(image_path)
+    if passthrough is not None:
+        return passthrough
+    return bytes(_prepare_request_image(image_path, None)), MODEL_IMAGE_MIME
+
+
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+_cpu_pool_lock = threading.Lock()
+# Never fork: by the time the pool starts, job workers, the log flusher and the
+# API-call pool are running and may hold locks that a forked child would inherit
+# locked. Workers start from a clean interpreter instead.
+_CPU_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    """Process pool (one worker per core) for the pre-request image work."""
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(_CPU_POOL_START_METHOD),
+            )
+        return _cpu_pool
+
+
+def shutdown_cpu_pool() -> None:
+    """Shut down the pre-request process pool (call on application shutdown)."""
+    global _cpu_pool
+    with _cpu_pool_lock:
+        pool, _cpu_pool = _cpu_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 def process_image_with_nano_banana(
@@ -205,123 +581,61 @@ def process_image_with_nano_banana(
     cancel_event=None,
     allow_description_prompt: bool = True,
     reference_image_paths: Optional[Sequence[str]] = None,
+    client: Optional[httpx.Client] = None,
+    out_buffer: Optional[io.BytesIO] = None,
+    prepared_input: Optional[tuple] = None,
 ):
+    """Generate an image with the nano-banana model and save it.
+
+    The result is written to output_path, or into out_buffer when given (the
+    output_path suffix still selects the format and nothing touches disk).
+    prepared_input is an optional (bytes, mime) model input already built by
+    prepare_model_input (e.g. in a worker process); otherwise it is built here.
+
+    Returns:
+        (ok, message)
+    """
     try:
         total_start = time.time()
         file_tag = f"[{Path(str(image_path)).name}]"
         prompt = str(prompt_override or extra_prompt or "").strip()
 
-        _check_cancel(cancel_event)
-
-        img = Image.open(image_path)
-        img.load()
-
-        cropped_img, crop_info = _maybe_crop_white_padding(img)
-        if crop_info:
-            img = cropped_img
+        # Reject an output Pillow cannot write before spending a model call on it
+        suffix = Path(str(output_path)).suffix.lower()
+        if suffix not in _WRITABLE_SUFFIX_FORMATS:
+            return False, f"Unsupported output format: {suffix or str(output_path)}"
 
         _check_cancel(cancel_event)
 
-        send_img = img.convert("RGB") if img.mode != "RGB" else img
-        w0, h0 = send_img.size
-        if w0 > 0 and h0 > 0:
-            target_ratio = 3.0 / 4.0
-            cur_ratio = w0 / float(h0)
-            if abs(cur_ratio - target_ratio) > 0.005:
-                if cur_ratio > target_ratio:
-                    canvas_w = w0
-                    canvas_h = max(1, int(round(w0 / target_ratio)))
-                else:
-                    canvas_h = h0
-                    canvas_w = max(1, int(round(h0 * target_ratio)))
-                sample_points = [
-                    (0, 0),
-                    (w0 - 1, 0),
-                    (0, h0 - 1),
-                    (w0 - 1, h0 - 1),
-                    (w0 // 2, 0),
-                    (w0 // 2, h0 - 1),
-                ]
-                r_total = 0
-                g_total = 0
-                b_total = 0
-                for x, y in sample_points:
-                    pixel = send_img.getpixel((x, y))
-                    r_total += pixel[0]
-                    g_total += pixel[1]
-                    b_total += pixel[2]
-                count = len(sample_points)
-                bg_color = (r_total // count, g_total // count, b_total // count)
-                base_bg = send_img.resize((canvas_w, canvas_h), Image.LANCZOS)
-                blurred_bg = base_bg.filter(ImageFilter.GaussianBlur(radius=25))
-                color_layer = Image.new("RGB", (canvas_w, canvas_h), bg_color)
-                canvas = Image.blend(blurred_bg, color_layer, alpha=0.4)
-                offset_x = (canvas_w - w0) // 2
-                offset_y = (canvas_h - h0) // 2
-                canvas.paste(send_img, (offset_x, offset_y))
-                send_img = canvas
-
-        request_max_long_side = 1600
-        request_max_bytes = 0
-
-        w0, h0 = send_img.size
-        long0 = max(w0, h0)
-        if long0 > request_max_long_side and long0 > 0:
-            scale0 = request_max_long_side / float(long0)
-            nw0 = max(1, int(round(w0 * scale0)))
-            nh0 = max(1, int(round(h0 * scale0)))
-            send_img = send_img.resize((nw0, nh0), Image.LANCZOS)
-
-        image_bytes = b""
-        # Use WebP for better compression (smaller files, faster upload)
-        for attempt in range(6):
-            buffer = io.BytesIO()
-
-            # First attempt: WebP with high quality
-            if attempt == 0:
-                send_img.save(buffer, format="WEBP", quality=85, method=6)
+        if prepared_input is not None:
+            image_bytes, image_mime = prepared_input
+        else:
+            # Source already fits the request (3:4, small enough, no white padding):
+            # send its bytes as-is instead of decoding and re-encoding
+            passthrough = _passthrough_source(image_path)
+            if passthrough is not None:
+                image_bytes, image_mime = passthrough
             else:
-                # Fallback to PNG if WebP is still too large
-                send_img.save(buffer, format="PNG", optimize=True)
-
-            image_bytes = buffer.getvalue()
-
-            if not request_max_bytes or len(image_bytes) <= request_max_bytes:
-                break
-
-            # Still too large - reduce dimensions
-            w1, h1 = send_img.size
-            long1 = max(w1, h1)
-            if long1 <= 256:
-                break
-
-            ratio = (request_max_bytes / float(len(image_bytes))) ** 0.5 if request_max_bytes else 0.9
-            ratio = max(0.5, min(0.95, ratio * 0.95))
-            nw1 = max(1, int(round(w1 * ratio)))
-            nh1 = max(1, int(round(h1 * ratio)))
-            if nw1 == w1 and nh1 == h1:
-                break
-            send_img = send_img.resize((nw1, nh1), Image.LANCZOS)
-
-        b64_image = base64.b64encode(image_bytes).decode("utf-8")
-        # Detect format from first bytes (WebP magic: RIFF....WEBP)
-        mime_type = "image/webp" if image_bytes[:4] == b"RIFF" and b"WEBP" in image_bytes[:12] else "image/png"
-        parts = [{"inlineData": {"mimeType": mime_type, "data": b64_image}}]
-
-        ref_paths: Iterable[str] = reference_image_paths or []
-        for rp in ref_paths:
-            try:
-                _check_cancel(cancel_event)
-                rp_str = str(rp or "").strip()
-                if not rp_str:
-                    continue
-                ref_img = Image.open(rp_str)
-                ref_img.load()
-                ref_b64 = encode_image_for_model(ref_img, max_long_side=1200)
+                image_bytes = _prepare_request_image(image_path, cancel_event)
+                image_mime = MODEL_IMAGE_MIME
+
+        b64_image = base64.b64encode(image_bytes).decode("ascii")
+        parts = [{"inlineData": {"mimeType": image_mime, "data": b64_image}}]
+
+        ref_paths = [str(rp or "").strip() for rp in (reference_image_paths or [])]
+        ref_paths = [rp for rp in ref_paths if rp]
+        if ref_paths:
+            _check_cancel(cancel_event)
+            # Independent decode/resize/encode per reference; PIL releases the GIL in
+            # its codecs, so the shared pool runs them in parallel. map() keeps prompt
+            # order. A single reference is encoded inline (no pool hop).
+            if len(ref_paths) == 1:
+                ref_results = [_load_and_encode_ref(ref_paths[0])]
+            else:
+                ref_results = _REF_ENCODE_POOL.map(_load_and_encode_ref, ref_paths)
+            for ref_b64 in ref_results:
                 if ref_b64:
-                    parts.append({"inlineData": {"mimeType": "image/png", "data": ref_b64}})
-            except Exception:
-                continue
+                    parts.append({"inlineData": {"mimeType": MODEL_IMAGE_MIME, "data": ref_b64}})
 
         parts.append({"text": prompt})
 
@@ -359,10 +673,10 @@ def process_image_with_nano_banana(
         for attempt in range(1, max_retries + 1):
             try:
                 _check_cancel(cancel_event)
-                response = _post_with_cancel(url, payload, headers, request_timeout, cancel_event)
+                response = _post_with_cancel(url, payload, headers, request_timeout, cancel_event, client)
                 if response.status_code == 200:
                     try:
-                        result = response.json()
+                        result = orjson.loads(response.content)
                     except Exception as e:
                         request_error_text = f"Invalid JSON response: {e}"
                         break
@@ -377,27 +691,8 @@ def process_image_with_nano_banana(
                     except Exception:
                         pass
 
-                    def _extract_inline_data(part):
-                        """Extract inline data from part, checking both inlineData and inline_data keys"""
-                        if not isinstance(part, dict):
-                            return None
-                        inline_data = part.get("inlineData") or part.get("inline_data")
-                        if isinstance(inline_data, dict):
-                            data_value = inline_data.get("data")
-                            if data_value:
-                                return data_value
-                        return None
-
-                    image_data_part = None
-                    for candidate in candidates:
-                        parts = candidate.get("content", {}).get("parts", [])
-                        for part in parts:
-                            result_base64 = _extract_inline_data(part)
-                            if result_base64:
-                                image_data_part = {"data": result_base64}
-                                break
-                        if image_data_part:
-                            break
+                    result_base64 = _find_inline_image_data(result)
+                    image_data_part = {"data": result_base64} if result_base64 else None
 
                     if not image_data_part:
                         request_error_text = "No image data found in response"
@@ -408,13 +703,13 @@ def process_image_with_nano_banana(
                     break
                 request_error_text = f"Error code: {response.status_code} - {response.text}"
                 if response.status_code >= 500 and attempt < max_retries:
-                    time.sleep(5 * attempt)
+                    _sleep_or_cancel(cancel_event, 5 * attempt)
                     continue
                 break
             except (httpx.TimeoutException, httpx.NetworkError) as e:
                 last_error = e
                 if attempt < max_retries:
-                    time.sleep(5 * attempt)
+                    _sleep_or_cancel(cancel_event, 5 * attempt)
                     continue
                 request_error_text = f"Request error after retries: {e}"
                 break
@@ -430,49 +725,70 @@ def process_image_with_nano_banana(
             return False, "Unknown request error"
 
         _check_cancel(cancel_event)
-        img_bytes = base64.b64decode(final_image_data_part["data"])
+        img_bytes = _b64decode_image(final_image_data_part["data"])
+        # Image.open only parses the header; pixels are decoded on first use
         img = Image.open(io.BytesIO(img_bytes))
 
-        suffix = Path(str(output_path)).suffix.lower()
+        dest = out_buffer if out_buffer is not None else output_path
         target_size = (int(target_width), int(target_height))
-        if target_size[0] > 0 and target_size[1] > 0 and img.size != target_size:
+        needs_resize = target_size[0] > 0 and target_size[1] > 0 and img.size != target_size
+
+        # Already the right size and container: store the model's bytes as-is
+        # (no decode, and no lossy re-encode for JPEG/WebP)
+        if not needs_resize and _SUFFIX_FORMATS.get(suffix) == img.format:
+            if out_buffer is not None:
+                out_buffer.write(img_bytes)
+            else:
+                Path(str(output_path)).write_bytes(img_bytes)
+            return True, f"Image processed: {output_path}"
+
+        # JPEG larger than 2x the target: let libjpeg decode at a reduced DCT scale
+        if needs_resize and img.format == "JPEG":
+            img.draft("RGB", target_size)
+
+        if needs_resize:
             tw, th = target_size
             iw, ih = img.size
             if iw > 0 and ih > 0:
                 target_ratio = tw / float(th)
                 img_ratio = iw / float(ih)
                 if abs(img_ratio - target_ratio) <= 0.002:
-                    img = img.resize((tw, th), Image.LANCZOS)
+                    img = _resize(img, (tw, th))
                 else:
-                    has_alpha = suffix == ".png" and "A" in img.getbands()
-                    base = img.convert("RGBA") if has_alpha else img.convert("RGB")
+                    has_alpha = suffix == ".png" and img.mode in ("RGBA", "LA", "PA")
+                    target_mode = "RGBA" if has_alpha else "RGB"
+                    # convert() to the same mode is a full copy; resize() copies anyway
+                    base = img if img.mode == target_mode else img.convert(target_mode)
+                    # Cover-fit: resample only the centered source region that maps onto
+                    # the target, in one pass (no oversized intermediate to crop). Same
+                    # as ImageOps.fit, which cannot pass _resize's reducing_gap.
                     scale = max(tw / float(iw), th / float(ih))
-                    new_w = max(1, int(round(iw * scale)))
-                    new_h = max(1, int(round(ih * scale)))
-                    resized = base.resize((new_w, new_h), Image.LANCZOS)
-                    left = max(0, (new_w - tw) // 2)
-                    top = max(0, (new_h - th) // 2)
-                    right = min(new_w, left + tw)
-                    bottom = min(new_h, top + th)
-                    img = resized.crop((left, top, right, bottom))
+                    box_w = tw / scale
+                    box_h = th / scale
+                    left = (iw - box_w) / 2.0
+                    top = (ih - box_h) / 2.0
+                    img = _resize(base, (tw, th), box=(left, top, left + box_w, top + box_h))
 
         _check_cancel(cancel_event)
         if suffix in {".jpg", ".jpeg"}:
             if img.mode not in {"RGB", "L"}:
                 img = img.convert("RGB")
-            img.save(output_path, format="JPEG", quality=95, optimize=True, progressive=True)
+            img.save(dest, format="JPEG", quality=95, optimize=True, progressive=True)
         elif suffix == ".webp":
-            img.save(output_path, format="WEBP", quality=95, method=6)
+            img.save(dest, format="WEBP", quality=95, method=WEBP_METHOD)
         elif suffix == ".png":
-            img.save(output_path, format="PNG", optimize=True)
+            # optimize=True means zlib level 9: several times the CPU of the default
+            # level 6 for ~1% smaller files. Level 1 is not used since outputs are
+            # stored and served, where its 10-30% larger files would cost more.
+            img.save(dest, format="PNG", compress_level=6)
         elif suffix == ".bmp":
             if img.mode not in {"RGB", "L"}:
                 img = img.convert("RGB")
-            img.save(output_path, format="BMP")
+            img.save(dest, format="BMP")
         elif suffix == ".gif":
-            img.save(output_path, format="GIF")
+            img.save(dest, format="GIF")
         else:
-            img.save(output_path)
+            img.save(dest, format=_WRITABLE_SUFFIX_FORMATS[suffix])
 
         total_end = time.time()
         _ = total_end - total_start
@@ -495,6 +811,7 @@ async def _process_sku_main_async(
     output_format: str,
     rate_limiter: AsyncRateLimiter,
     downloader: AsyncFileDownloader,
+    client: Optional[httpx.Client] = None,
 ) -> dict:
     """Process main image for a single SKU asynchronously."""
     from app.services.image_studio_queue import check_cancelled
@@ -504,21 +821,20 @@ async def _process_sku_main_async(
     if not sources:
         return {"sku": sku_name, "ok": False, "error": "No sources"}
 
+    from app.services.image_studio_worker import _stem_from_name, _is_main_stem
+
+    # The name order defines the image_N indices (also reused by the secondary
+    # stage), so the sort stays; timsort is linear on already-ordered input.
+    # Index assignment and the main-image search share one pass.
     sources_sorted = sorted(sources, key=lambda s: str(s.get("name") or s.get("url") or ""))
 
-    # Assign sequential indices to sorted sources for consistent naming
+    head = None
     for idx, item in enumerate(sources_sorted, start=1):
         item["_image_index"] = idx
-
-    # Find main image
-    from app.services.image_studio_worker import _stem_from_name, _is_main_stem
-
-    head = None
-    for item in sources_sorted:
-        stem_value = item.get("stem") or _stem_from_name(str(item.get("name") or ""))
-        if _is_main_stem(stem_value):
-            head = item
-            break
+        if head is None:
+            stem_value = item.get("stem") or _stem_from_name(str(item.get("name") or ""))
+            if _is_main_stem(stem_value):
+                head = item
     if head is None:
         head = sources_sorted[0]
 
@@ -534,16 +850,31 @@ async def _process_sku_main_async(
             source_path = temp_path / f"input{suffix}"
             await downloader.download(str(head.get("url")), source_path)
 
-            # Process with AI (this part is still CPU-bound, we'll keep it sync for now)
+            # Build the model input (crop/letterbox/resize/encode) in the process pool,
+            # so the SKUs' CPU stages run in parallel across cores
+            loop = asyncio.get_running_loop()
+            prepared_input = await loop.run_in_executor(
+                _get_cpu_pool(), prepare_model_input, str(source_path)
+            )
+
+            # Model call and output save in a worker thread: the blocking API call and
+            # the final decode/resize/encode (PIL releases the GIL in its codecs) then
+            # overlap with the other SKUs instead of stalling the event loop. The result
+            # is encoded into memory and uploaded from there (no temp-file round trip).
             output_path = temp_path / f"output{suffix}"
+            out_buffer = io.BytesIO()
 
-            ok, msg = process_image_with_nano_banana(
+            ok, msg = await asyncio.to_thread(
+                process_image_with_nano_banana,
                 api_key, api_base, model,
                 str(source_path), str(output_path),
                 prompt_override, temperature,
                 target_width, target_height,
                 True,  # is_main
                 cancel_event=None,  # TODO: pass cancel event
+                client=client,
+                out_buffer=out_buffer,
+                prepared_input=prepared_input,
             )
 
             if not ok:
@@ -559,18 +890,18 @@ async def _process_sku_main_async(
             image_index = head.get("_image_index", 1)
             filename = f"image_{image_index}.{output_format}"
 
-            # For now, sync upload (we'll async this in next task)
-            output_bytes = output_path.read_bytes()
-            output_url = r2.upload_bytes_sync(
-                data=output_bytes,
+            size_bytes = out_buffer.tell()
+            out_buffer.seek(0)
+            output_url = await r2.upload_fileobj_async(
+                out_buffer,
                 key=f"image-studio/{sku_name}/{filename}",
                 content_type=_infer_content_type(output_format),
             )
 
-            # Build metadata
-            from PIL import Image
-            img = Image.open(output_path)
-            meta = {"width": img.width, "height": img.height, "size_bytes": len(output_bytes)}
+            # Build metadata (header only)
+            out_buffer.seek(0)
+            img = Image.open(out_buffer)
+            meta = {"width": img.width, "height": img.height, "size_bytes": size_bytes}
 
             return {
                 "sku": sku_name,
@@ -606,6 +937,8 @@ async def process_batch_main_async(
 
     rate_limiter = AsyncRateLimiter(max_workers)
     downloader = AsyncFileDownloader()
+    # One keep-alive HTTP/2 client for all model calls in this batch
+    client = _new_api_client(max(1, max_workers) * 2)
 
     # Track active job
     active_jobs.inc()
@@ -630,7 +963,7 @@ async def process_batch_main_async(
                 api_key, api_base, model,
                 target_width, target_height, temperature,
                 prompt_override, output_format,
-                rate_limiter, downloader,
+                rate_limiter, downloader, client,
             )
             for sku_name, sources in sku_images_map.items()
         ]
@@ -692,6 +1025,7 @@ async def process_batch_main_async(
 
     finally:
         await downloader.close()
+        client.close()
         active_jobs.dec()
 
 
@@ -1,11 +1,11 @@
 import queue
 import threading
+from contextvars import ContextVar
 import time
-import uuid
 import sys
 import os
-from collections import deque
 from pathlib import Path
+from types import MappingProxyType
 from typing import Optional
 
 
@@ -13,40 +13,137 @@ class CancelledError(Exception):
     pass
 
 
-_TLS = threading.local()
+class JobContext:
+    """What code running on behalf of a job needs: id, cancel flag and log sink.
+
+    The worker fills one in per job and exposes it through _JOB_CONTEXT, so hot
+    paths (print routing, check_cancelled) do a single lookup for all fields.
+    """
+
+    __slots__ = ("job_id", "cancel_event", "log_file", "log_lock", "log_bytes")
+
+    def __init__(self, job_id=None, cancel_event=None, log_file=None, log_lock=None, log_bytes=0):
+        self.job_id = job_id
+        self.cancel_event = cancel_event
+        self.log_file = log_file
+        self.log_lock = log_lock
+        # Bytes written to log_file; published to JobQueue._log_bytes when the log closes
+        self.log_bytes = log_bytes
+
+
+# Per-thread like threading.local, and also carried into asyncio tasks and
+# asyncio.to_thread calls made from a job
+_JOB_CONTEXT: ContextVar[Optional[JobContext]] = ContextVar("image_studio_job", default=None)
+
+# Job output is buffered per thread and routed once a line completes (or this many
+# characters are pending), so workers never serialize on a shared stream lock
+ROUTER_BUFFER_CHARS = 4096
+
+# Job log files are written through a userspace buffer of this size and flushed by
+# one background thread at this interval (and on close), not after every write
+LOG_FILE_BUFFER_BYTES = 64 * 1024
+LOG_FLUSH_INTERVAL = 0.05
+
+
+def _flush_std_streams():
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
 
 
 def check_cancelled():
-    ev = getattr(_TLS, "cancel_event", None)
-    if ev is not None and ev.is_set():
-        raise CancelledError("Job cancelled")
+    # Cheap enough for hot loops: one ContextVar get; Event.is_set() is a plain
+    # attribute read (no lock)
+    ctx = _JOB_CONTEXT.get()
+    if ctx is not None:
+        ev = ctx.cancel_event
+        if ev is not None and ev.is_set():
+            raise CancelledError("Job cancelled")
+
+
+def wait_cancelled(timeout):
+    # Sleep up to `timeout` seconds but wake as soon as the current job is
+    # cancelled; returns True if it was. Use instead of time.sleep() + check_cancelled().
+    ctx = _JOB_CONTEXT.get()
+    ev = ctx.cancel_event if ctx is not None else None
+    if ev is None:
+        time.sleep(timeout)
+        return False
+    return ev.wait(timeout)
 
 
 def get_cancel_event():
-    return getattr(_TLS, "cancel_event", None)
+    ctx = _JOB_CONTEXT.get()
+    return ctx.cancel_event if ctx is not None else None
 
 
 def capture_job_context():
-    return {
-        "job_id": getattr(_TLS, "job_id", None),
-        "cancel_event": getattr(_TLS, "cancel_event", None),
-        "log_file": getattr(_TLS, "log_file", None),
-    }
+    return _JOB_CONTEXT.get()
 
 
 def run_in_job_context(ctx, fn, *args, **kwargs):
-    prev_job_id = getattr(_TLS, "job_id", None)
-    prev_cancel_event = getattr(_TLS, "cancel_event", None)
-    prev_log_file = getattr(_TLS, "log_file", None)
+    token = _JOB_CONTEXT.set(ctx)
     try:
-        _TLS.job_id = (ctx or {}).get("job_id")
-        _TLS.cancel_event = (ctx or {}).get("cancel_event")
-        _TLS.log_file = (ctx or {}).get("log_file")
         return fn(*args, **kwargs)
     finally:
-        _TLS.job_id = prev_job_id
-        _TLS.cancel_event = prev_cancel_event
-        _TLS.log_file = prev_log_file
+        # Route any partial line buffered for this job before leaving its context
+        _flush_std_streams()
+        _JOB_CONTEXT.reset(token)
+
+
+class _LogRing:
+    """The last `limit` bytes of a job's output.
+
+    The bytearray grows with the output until it reaches `limit`, then is reused
+    as a ring: appends overwrite the oldest bytes in place (at most two slice
+    copies), so trimming never allocates or walks chunks.
+    """
+
+    __slots__ = ("limit", "buf", "head")
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.buf = bytearray()
+        self.head = 0
+
+    def append(self, data):
+        limit = self.limit
+        n = len(data)
+        if n >= limit:
+            self.buf = bytearray(data[n - limit:])
+            self.head = 0
+            return
+        buf = self.buf
+        view = memoryview(data)
+        room = limit - len(buf)
+        if room > 0:
+            buf += view[:room]
+            if n <= room:
+                return
+            view = view[room:]
+            n -= room
+        head = self.head
+        first = min(n, limit - head)
+        buf[head:head + first] = view[:first]
+        if first < n:
+            buf[:n - first] = view[first:]
+        self.head = (head + n) % limit
+
+    def getvalue(self):
+        if not self.head:
+            return bytes(self.buf)
+        return bytes(self.buf[self.head:]) + bytes(self.buf[:self.head])
+
+
+def _log_span_start(size, from_bytes, tail_bytes):
+    # Start offset of a log read: explicit offset, else last tail_bytes, else whole file
+    if from_bytes is not None and from_bytes >= 0:
+        return min(from_bytes, size)
+    if tail_bytes is not None and tail_bytes > 0:
+        return max(0, size - int(tail_bytes))
+    return 0
 
 
 class JobQueue:
@@ -58,7 +155,9 @@ class JobQueue:
             lanes = ["default"]
 
         self._lanes = lanes
-        self._queues = {lane: queue.Queue() for lane in lanes}
+        # SimpleQueue: C-implemented unbounded FIFO; put() never blocks or takes the
+        # Condition-based mutex queue.Queue uses (no task_done/join/maxsize needed here)
+        self._queues = {lane: queue.SimpleQueue() for lane in lanes}
         self._lane_workers = {}
         if isinstance(lane_workers, dict):
             for k, v in lane_workers.items():
@@ -79,22 +178,21 @@ class JobQueue:
         self._threads = {}
         self._log_limit = 200000
         self._logs = {}
-        self._log_counts = {}
         self._cancel_events = {}
         self._log_paths = {}
         self._log_bytes = {}
         self._log_write_locks = {}
+        self._open_log_files = {}
         self._log_dir = Path(log_dir or "job_logs")
         self._router_installed = False
         self._orig_stdout = None
         self._orig_stderr = None
-        self._stdout_lock = threading.Lock()
-        self._stderr_lock = threading.Lock()
 
     def start(self):
         if any(t and t.is_alive() for t in self._threads.values()):
             return
         self._stop.clear()
+        self._restore_queue_order()
         self._install_router()
         for lane in self._lanes:
             n = int(self._lane_workers.get(lane, 1) or 1)
@@ -105,6 +203,9 @@ class JobQueue:
                 t = threading.Thread(target=self._worker, args=(lane,), name=name, daemon=True)
                 self._threads[name] = t
                 t.start()
+        t = threading.Thread(target=self._log_flusher, name="job-log-flusher", daemon=True)
+        self._threads["job-log-flusher"] = t
+        t.start()
 
     def stop(self):
         self._stop.set()
@@ -118,11 +219,31 @@ class JobQueue:
             except Exception:
                 pass
 
+    def _restore_queue_order(self):
+        # Runs from start() once no worker is alive. Workers that were stopped while
+        # holding a job put it back at the tail, and unused stop() sentinels may be
+        # left over: drop the sentinels and put jobs back in enqueue order.
+        with self._lock:
+            position = {job_id: i for i, job_id in enumerate(self._order)}
+            for q in self._queues.values():
+                items = []
+                while True:
+                    try:
+                        item = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        items.append(item)
+                items.sort(key=lambda item: position.get(item[0], len(position)))
+                for item in items:
+                    q.put(item)
+
     def enqueue(self, mode, sku, stem, options, runner, prompt=None, lane="default", job_id: Optional[str] = None):
         lane = str(lane or "").strip() or "default"
         if lane not in self._queues:
             lane = self._lanes[0]
-        job_id = job_id or uuid.uuid4().hex
+        # 32 hex chars like uuid4().hex, without building a UUID object
+        job_id = job_id or os.urandom(16).hex()
         cancel_event = threading.Event()
         prompt = None if prompt is None else str(prompt)
         job = {
@@ -148,64 +269,64 @@ class JobQueue:
         with self._lock:
             self._jobs[job_id] = job
             self._order.append(job_id)
-            self._logs[job_id] = deque()
-            self._log_counts[job_id] = 0
+            self._logs[job_id] = _LogRing(self._log_limit)
             self._cancel_events[job_id] = cancel_event
             self._log_paths[job_id] = None
             self._log_bytes[job_id] = 0
             self._log_write_locks[job_id] = threading.Lock()
-        self._queues[lane].put((job_id, runner))
+            # Under the lock so start() can reorder a lane without racing enqueues
+            self._queues[lane].put((job_id, runner))
         return job_id
 
     def get(self, job_id):
         with self._lock:
             job = self._jobs.get(job_id)
-            return dict(job) if job else None
+            return MappingProxyType(job) if job else None
 
     def get_log(self, job_id):
         with self._lock:
-            if job_id not in self._logs:
+            ring = self._logs.get(job_id)
+            if ring is None:
                 return None
             p = self._log_paths.get(job_id)
-            if p:
-                try:
-                    path = Path(p)
-                    if path.exists() and path.is_file():
-                        data = path.read_bytes()
-                        return data.decode("utf-8", errors="replace")
-                except Exception:
-                    pass
-            return "".join(self._logs[job_id])
+            job_lock = self._log_write_locks[job_id]
+        if p:
+            try:
+                with open(p, "rb") as f:
+                    data = f.read()
+                return data.decode("utf-8", errors="replace")
+            except Exception:
+                pass
+        with job_lock:
+            data = ring.getvalue()
+        return data.decode("utf-8", errors="replace")
 
     def get_log_chunk(self, job_id, *, from_bytes=None, tail_bytes=None):
         with self._lock:
             if job_id not in self._logs:
                 return None
             p = self._log_paths.get(job_id)
-            total = int(self._log_bytes.get(job_id, 0) or 0)
         if p:
+            # One open + fstat (+ pread) instead of exists/is_file/stat/seek/read;
+            # a missing file or a directory fails the open and falls back below
             try:
-                path = Path(p)
-                if path.exists() and path.is_file():
-                    size = path.stat().st_size
-                    total = size
-                    if from_bytes is not None and from_bytes >= 0:
-                        start = min(from_bytes, size)
-                    elif tail_bytes is not None and tail_bytes > 0:
-                        start = max(0, size - int(tail_bytes))
+                with open(p, "rb") as f:
+                    # The file size is the live total; _log_bytes is only
+                    # published when the job's log closes
+                    size = os.fstat(f.fileno()).st_size
+                    start = _log_span_start(size, from_bytes, tail_bytes)
+                    if hasattr(os, "pread"):
+                        b = os.pread(f.fileno(), size - start, start)
                     else:
-                        start = 0
-                    with open(path, "rb") as f:
-                        if start:
-                            f.seek(start, os.SEEK_SET)
-                        b = f.read()
-                    return {
-                        "log": b.decode("utf-8", errors="replace"),
-                        "from": start,
-                        "to": start + len(b),
-                        "total": total,
-                        "log_path": str(path),
-                    }
+                        f.seek(start, os.SEEK_SET)
+                        b = f.read(size - start)
+                return {
+                    "log": b.decode("utf-8", errors="replace"),
+                    "from": start,
+                    "to": start + len(b),
+                    "total": size,
+                    "log_path": p,
+                }
             except Exception:
                 pass
         txt = self.get_log(job_id)
@@ -215,6 +336,28 @@ class JobQueue:
             txt = txt[-tail_bytes:]
         return {"log": txt, "from": 0, "to": len(txt), "total": len(txt), "log_path": None}
 
+    def get_log_chunk_fd(self, job_id, *, from_bytes=None, tail_bytes=None):
+        # Raw variant of get_log_chunk for streaming a range straight to a response:
+        # returns (fd, start, length, total) and the caller closes fd. None when the
+        # job is unknown or has no log file (get_log_chunk serves the ring then).
+        with self._lock:
+            if job_id not in self._logs:
+                return None
+            p = self._log_paths.get(job_id)
+        if not p:
+            return None
+        try:
+            fd = os.open(p, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            size = os.fstat(fd).st_size
+            start = _log_span_start(size, from_bytes, tail_bytes)
+        except Exception:
+            os.close(fd)
+            return None
+        return fd, start, size - start, size
+
     def cancel(self, job_id):
         with self._lock:
             job = self._jobs.get(job_id)
@@ -223,20 +366,21 @@ class JobQueue:
             status = job.get("status")
             if status in {"success", "failed", "cancelled"}:
                 return True, status
-            job["cancel_requested"] = True
             ev = self._cancel_events.get(job_id)
             if ev is not None:
                 ev.set()
             if status == "queued":
-                job["status"] = "cancelled"
-                job["finished_at"] = time.time()
-                job["error"] = None
+                self._update_job(job_id, cancel_requested=True, status="cancelled",
+                                 finished_at=time.time(), error=None)
+            else:
+                self._update_job(job_id, cancel_requested=True)
             return True, "ok"
 
     def snapshot(self, recent_limit=50):
         with self._lock:
-            ordered = list(self._order)[-recent_limit:]
-            jobs = [dict(self._jobs[jid]) for jid in ordered if jid in self._jobs]
+            # Tail slice copies only recent_limit ids (not the whole history)
+            ordered = self._order[-recent_limit:]
+            jobs = [MappingProxyType(self._jobs[jid]) for jid in ordered if jid in self._jobs]
         running_jobs = [j for j in reversed(jobs) if j["status"] == "running"]
         running = running_jobs[0] if running_jobs else None
         queued = [j for j in jobs if j["status"] == "queued"]
@@ -247,21 +391,36 @@ class JobQueue:
             "jobs": jobs,
         }
 
-    def _append_log(self, job_id, text):
-        if not text:
+    def _append_log(self, job_id, data):
+        # Caller holds the job's write lock
+        if not data:
             return
-        with self._lock:
-            if job_id not in self._logs:
-                return
-            dq = self._logs[job_id]
-            dq.append(text)
-            self._log_counts[job_id] += len(text)
-            truncated = False
-            while self._log_counts[job_id] > self._log_limit and dq:
-                removed = dq.popleft()
-                self._log_counts[job_id] -= len(removed)
-                truncated = True
-            _ = truncated
+        ring = self._logs.get(job_id)
+        if ring is not None:
+            ring.append(data)
+
+    def _write_job_log(self, ctx, text):
+        # A job's log file, ring and byte count are guarded by its own write lock,
+        # so logging never contends with job bookkeeping on self._lock
+        # Encoded once; the same bytes go to the file and the ring. Plain encode()
+        # (UTF-8, no argument parsing) only fails on lone surrogates.
+        try:
+            b = text.encode()
+        except UnicodeEncodeError:
+            b = text.encode("utf-8", errors="replace")
+        job_lock = ctx.log_lock
+        if job_lock is None:
+            return
+        job_id = ctx.job_id
+        with job_lock:
+            log_file = ctx.log_file
+            if log_file is not None:
+                try:
+                    log_file.write(b)
+                    ctx.log_bytes += len(b)
+                except Exception:
+                    pass
+            self._append_log(job_id, b)
 
     def _install_router(self):
         if self._router_installed:
@@ -272,62 +431,56 @@ class JobQueue:
         parent = self
 
         class RouterStream:
-            def __init__(self, original_stream, lock):
+            def __init__(self, original_stream):
                 self._original = original_stream
-                self._lock = lock
+                self._local = threading.local()
 
             def write(self, s):
                 if not s:
                     return 0
-                job_id = getattr(_TLS, "job_id", None)
-                log_file = getattr(_TLS, "log_file", None)
-                job_lock = None
-                if job_id and log_file is not None:
+                ctx = _JOB_CONTEXT.get()
+                if ctx is None or ctx.log_file is None:
+                    # Not inside a job: nothing to route, pass straight through
                     try:
-                        job_lock = parent._log_write_locks.get(job_id)
+                        self._original.write(s)
                     except Exception:
-                        job_lock = None
-                try:
-                    if self._lock:
-                        self._lock.acquire()
-                    if job_lock:
-                        job_lock.acquire()
-                    try:
-                        if job_id and log_file is not None:
-                            try:
-                                b = s.encode("utf-8", errors="replace")
-                                log_file.write(b)
-                                try:
-                                    log_file.flush()
-                                except Exception:
-                                    pass
-                                with parent._lock:
-                                    parent._log_bytes[job_id] = int(parent._log_bytes.get(job_id, 0) or 0) + len(b)
-                            except Exception:
-                                pass
-                            parent._append_log(job_id, s)
-                        try:
-                            self._original.write(s)
-                        except Exception:
-                            pass
-                    finally:
-                        if job_lock:
-                            try:
-                                job_lock.release()
-                            except Exception:
-                                pass
-                finally:
-                    if self._lock:
-                        try:
-                            self._lock.release()
-                        except Exception:
-                            pass
+                        pass
+                    return len(s)
+
+                local = self._local
+                parts = getattr(local, "parts", None)
+                if parts is None:
+                    parts = local.parts = []
+                    local.size = 0
+                    local.owner = None
+                if parts and local.owner is not ctx:
+                    self._drain()
+                local.owner = ctx
+                parts.append(s)
+                local.size += len(s)
+                if "\n" in s or local.size >= ROUTER_BUFFER_CHARS:
+                    self._drain()
                 return len(s)
 
+            def _drain(self):
+                local = self._local
+                parts = getattr(local, "parts", None)
+                if not parts:
+                    return
+                text = "".join(parts)
+                parts.clear()
+                local.size = 0
+                parent._write_job_log(local.owner, text)
+                try:
+                    self._original.write(text)
+                except Exception:
+                    pass
+
             def flush(self):
-                job_id = getattr(_TLS, "job_id", None)
-                log_file = getattr(_TLS, "log_file", None)
-                if job_id and log_file is not None:
+                self._drain()
+                ctx = _JOB_CONTEXT.get()
+                log_file = ctx.log_file if ctx is not None else None
+                if log_file is not None:
                     try:
                         log_file.flush()
                     except Exception:
@@ -343,76 +496,128 @@ class JobQueue:
                 except Exception:
                     return False
 
-        sys.stdout = RouterStream(self._orig_stdout, self._stdout_lock)
-        sys.stderr = RouterStream(self._orig_stderr, self._stderr_lock)
+        sys.stdout = RouterStream(self._orig_stdout)
+        sys.stderr = RouterStream(self._orig_stderr)
+
+    def _update_job(self, job_id, **changes):
+        # Caller holds self._lock. Job dicts are copy-on-write: an update swaps in a
+        # new dict, so get()/snapshot() can hand out read-only views without copying.
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job = {**job, **changes}
+        self._jobs[job_id] = job
+        return job
+
+    def _finish_job(self, job_id, **changes):
+        with self._lock:
+            self._update_job(
+                job_id,
+                finished_at=time.time(),
+                log_path=self._log_paths.get(job_id),
+                log_bytes=int(self._log_bytes.get(job_id, 0) or 0),
+                **changes,
+            )
+
+    def _close_job_log(self, ctx):
+        # Detach the file from the context first: threads still holding the
+        # context then pass their output through instead of hitting a closed file
+        with self._lock:
+            self._open_log_files.pop(ctx.job_id, None)
+        with ctx.log_lock:
+            log_file, ctx.log_file = ctx.log_file, None
+            if log_file is not None:
+                self._log_bytes[ctx.job_id] = ctx.log_bytes
+                try:
+                    log_file.close()
+                except Exception:
+                    pass
+
+    def _log_flusher(self):
+        # One thread for the whole queue: push buffered log output of running jobs
+        # to disk every LOG_FLUSH_INTERVAL so log readers stay close to live
+        while not self._stop.wait(LOG_FLUSH_INTERVAL):
+            with self._lock:
+                open_files = [
+                    (self._log_write_locks.get(job_id), f)
+                    for job_id, f in self._open_log_files.items()
+                ]
+            for job_lock, f in open_files:
+                try:
+                    if job_lock is not None:
+                        with job_lock:
+                            f.flush()
+                    else:
+                        f.flush()
+                except Exception:
+                    pass
 
     def _worker(self, lane):
-        while not self._stop.is_set():
-            item = self._queues[lane].get()
+        # Loop-invariant lookups hoisted once per worker thread
+        q = self._queues[lane]
+        stop = self._stop
+        lock = self._lock
+        update_job = self._update_job
+        # Resolved log directory, created on first use and reused for every job
+        # (mkdir + resolve() cost several syscalls each)
+        log_dir = None
+        while not stop.is_set():
+            # Blocks without polling; stop() wakes each worker with a None sentinel
+            item = q.get()
             if item is None:
                 continue
+            if stop.is_set():
+                # Stopped while this job waited ahead of the sentinels: leave it
+                # queued rather than run it now; start() restores FIFO order
+                q.put(item)
+                break
             job_id, runner = item
-            with self._lock:
+            with lock:
                 job = self._jobs.get(job_id)
                 if not job:
                     continue
                 if job.get("status") == "cancelled":
                     continue
-                job["status"] = "running"
-                job["started_at"] = time.time()
-                job["error"] = None
-                job["result"] = None
+                update_job(job_id, status="running", started_at=time.time(),
+                           error=None, result=None)
+                ctx = JobContext(
+                    job_id,
+                    self._cancel_events.get(job_id),
+                    None,
+                    self._log_write_locks[job_id],
+                    int(self._log_bytes.get(job_id, 0) or 0),
+                )
+            token = _JOB_CONTEXT.set(ctx)
             try:
-                _TLS.job_id = job_id
-                _TLS.cancel_event = self._cancel_events.get(job_id)
-                _TLS.log_file = None
                 log_file = None
                 try:
-                    self._log_dir.mkdir(parents=True, exist_ok=True)
-                    log_path = (self._log_dir / f"{job_id}.log").resolve()
-                    log_file = open(log_path, "ab")
-                    with self._lock:
-                        self._log_paths[job_id] = str(log_path)
-                        job = self._jobs.get(job_id)
-                        if job is not None:
-                            job["log_path"] = str(log_path)
-                            job["log_bytes"] = int(self._log_bytes.get(job_id, 0) or 0)
+                    if log_dir is None:
+                        self._log_dir.mkdir(parents=True, exist_ok=True)
+                        log_dir = self._log_dir.resolve()
+                    log_path = str(log_dir / f"{job_id}.log")
+                    log_file = open(log_path, "ab", buffering=LOG_FILE_BUFFER_BYTES)
+                    with lock:
+                        self._log_paths[job_id] = log_path
+                        self._open_log_files[job_id] = log_file
+                        update_job(job_id, log_path=log_path,
+                                   log_bytes=int(self._log_bytes.get(job_id, 0) or 0))
                 except Exception:
+                    # e.g. the directory was removed: recreate it for the next job
+                    log_dir = None
                     log_file = None
-                _TLS.log_file = log_file
-                result = runner()
-                with self._lock:
-                    job = self._jobs.get(job_id)
-                    if job:
-                        job["status"] = "success"
-                        job["result"] = result
-                        job["finished_at"] = time.time()
-                        job["log_path"] = self._log_paths.get(job_id)
-                        job["log_bytes"] = int(self._log_bytes.get(job_id, 0) or 0)
+                ctx.log_file = log_file
+                try:
+                    result = runner()
+                finally:
+                    # Route pending output and close the log before the final status
+                    # is published, so a finished job's log file is complete
+                    _flush_std_streams()
+                    self._close_job_log(ctx)
+                self._finish_job(job_id, status="success", result=result)
             except CancelledError as e:
-                with self._lock:
-                    job = self._jobs.get(job_id)
-                    if job:
-                        job["status"] = "cancelled"
-                        job["error"] = str(e)
-                        job["finished_at"] = time.time()
-                        job["log_path"] = self._log_paths.get(job_id)
-                        job["log_bytes"] = int(self._log_bytes.get(job_id, 0) or 0)
+                self._finish_job(job_id, status="cancelled", error=str(e))
             except Exception as e:
-                with self._lock:
-                    job = self._jobs.get(job_id)
-                    if job:
-                        job["status"] = "failed"
-                        job["error"] = str(e)
-                        job["finished_at"] = time.time()
-                        job["log_path"] = self._log_paths.get(job_id)
-                        job["log_bytes"] = int(self._log_bytes.get(job_id, 0) or 0)
+                self._finish_job(job_id, status="failed", error=str(e))
             finally:
-                _TLS.job_id = None
-                _TLS.cancel_event = None
-                _TLS.log_file = None
-                try:
-                    if log_file is not None:
-                        log_file.close()
-                except Exception:
-                    pass
+                _JOB_CONTEXT.reset(token)
+                self._close_job_log(ctx)
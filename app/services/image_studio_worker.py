@@ -7,6 +7,8 @@ from typing import Any, Dict, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
 
 from app.services.storage import R2Service
@@ -16,9 +18,24 @@ from app.core.config import settings
 from app.services.image_studio_engine import (
     process_image_with_nano_banana,
     encode_image_for_model,
+    is_supported_output_format,
+    MODEL_IMAGE_MIME,
 )
 
 
+# Shared session: source downloads and style-prompt calls reuse TCP+TLS connections
+# instead of a fresh Session (and handshake) per requests.get/post. pool_maxsize
+# covers the batch stages (up to 60 worker threads) so connections are not discarded.
+# Retry's default allowed_methods leaves POST alone, so only downloads are retried;
+# raise_on_status=False hands the final response to raise_for_status() as before.
+_RETRY = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=_RETRY))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=_RETRY))
+
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
 def _safe_filename_from_url(url: str) -> str:
     if not url:
         return ""
@@ -44,9 +61,12 @@ def _is_main_stem(stem: str) -> bool:
 
 
 def _download_to_file(url: str, path: Path) -> None:
-    resp = requests.get(url, timeout=120)
-    resp.raise_for_status()
-    path.write_bytes(resp.content)
+    # Streamed to disk so a large PNG is never held in memory as a whole
+    with _SESSION.get(url, timeout=120, stream=True) as resp:
+        resp.raise_for_status()
+        with path.open("wb") as f:
+            for chunk in resp.iter_content(DOWNLOAD_CHUNK_BYTES):
+                f.write(chunk)
 
 
 def _read_image_bytes(path: Path) -> bytes:
@@ -85,7 +105,7 @@ def _encode_style_prompt(
         "contents": [
             {
                 "parts": [
-                    {"inlineData": {"mimeType": "image/png", "data": b64_image}},
+                    {"inlineData": {"mimeType": MODEL_IMAGE_MIME, "data": b64_image}},
                     {"text": instruction},
                 ]
             }
@@ -93,7 +113,7 @@ def _encode_style_prompt(
         "generationConfig": {"temperature": 0.3},
     }
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    response = requests.post(url, json=payload, headers=headers, timeout=240)
+    response = _SESSION.post(url, json=payload, headers=headers, timeout=240)
     if response.status_code != 200:
         return ""
     data = response.json() or {}
@@ -138,6 +158,18 @@ def _build_batch_prompt(
     return "\n\n".join([s for s in segments if s]).strip()
 
 
+def _build_job_prompts(templates: Dict[str, str], extra_prompt: str, use_english: bool) -> Dict[str, Any]:
+    """Prompts fixed for a whole job ("batch" is keyed by is_main), built once instead of per image."""
+    return {
+        "extra_prompt": extra_prompt,
+        "batch": {
+            True: _build_batch_prompt(templates, True, extra_prompt, use_english),
+            False: _build_batch_prompt(templates, False, extra_prompt, use_english),
+        },
+        "style_instruction": _pick_prompt(templates, "style_extract_instruction_cn", use_english),
+    }
+
+
 def _build_optimize_prompt(
     templates: Dict[str, str],
     options: Dict[str, Any],
@@ -228,15 +260,20 @@ def _process_single_image(
         output_path = temp_dir_path / ("output" + suffix)
 
         check_cancelled()
-        _download_to_file(source_url, source_path)
-        check_cancelled()
-
         reference_paths = []
         if reference_urls:
+            # Source and reference downloads overlap instead of running back to back
+            downloads = [(source_url, source_path)]
             for idx, ref_url in enumerate(reference_urls):
                 ref_path = temp_dir_path / f"ref_{idx}{suffix}"
-                _download_to_file(ref_url, ref_path)
+                downloads.append((ref_url, ref_path))
                 reference_paths.append(str(ref_path))
+            with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+                for future in [executor.submit(_download_to_file, url, path) for url, path in downloads]:
+                    future.result()
+        else:
+            _download_to_file(source_url, source_path)
+        check_cancelled()
 
         ok, msg = process_image_with_nano_banana(
             api_key,
@@ -285,6 +322,7 @@ def _process_batch_concurrent(
     templates: Dict[str, str],
     use_english: bool,
     options: Dict[str, Any],
+    prompts: Dict[str, Any],
 ) -> List[Dict[str, Any]]:
     """Process batch images concurrently using ThreadPoolExecutor (two-stage approach)."""
     all_results = []
@@ -322,9 +360,9 @@ def _process_batch_concurrent(
 
         # Process main image
         is_main = True
-        prompt_override = _build_batch_prompt(templates, is_main, str(options.get("extra_prompt") or ""), use_english)
+        prompt_override = prompts["batch"][is_main]
         if not prompt_override:
-            prompt_override = str(options.get("extra_prompt") or "")
+            prompt_override = prompts["extra_prompt"]
 
         # Use sequential image index for consistent naming (image_1, image_2, etc.)
         image_index = head.get("_image_index", 1)
@@ -430,7 +468,7 @@ def _process_batch_concurrent(
             # Extract style prompt from main result if available
             style_prompt = ""
             if result.get("result_url") and options.get("include_style_prompt"):
-                instruction = _pick_prompt(templates, "style_extract_instruction_cn", use_english)
+                instruction = prompts["style_instruction"]
                 if instruction:
                     try:
                         with tempfile.TemporaryDirectory() as temp_dir:
@@ -456,7 +494,7 @@ def _process_batch_concurrent(
                 stem_value = item.get("stem") or _stem_from_name(str(item.get("name") or ""))
                 is_main = _is_main_stem(stem_value)
 
-                prompt_override = _build_batch_prompt(templates, is_main, str(options.get("extra_prompt") or ""), use_english)
+                prompt_override = prompts["batch"][is_main]
                 if style_prompt:
                     prompt_override = "\n\n".join([prompt_override, style_prompt]).strip()
 
@@ -544,6 +582,7 @@ def _process_secondary_images_sync(
     templates: Dict[str, str],
     use_english: bool,
     options: Dict[str, Any],
+    prompts: Dict[str, Any],
 ) -> List[Dict[str, Any]]:
     """Process secondary images after main images are done (sync version for async batch)."""
     if not do_secondary:
@@ -585,7 +624,7 @@ def _process_secondary_images_sync(
         # Extract style prompt from main result if available
         style_prompt = ""
         if result.get("result_url") and options.get("include_style_prompt"):
-            instruction = _pick_prompt(templates, "style_extract_instruction_cn", use_english)
+            instruction = prompts["style_instruction"]
             if instruction:
                 try:
                     with tempfile.TemporaryDirectory() as temp_dir:
@@ -611,7 +650,7 @@ def _process_secondary_images_sync(
             stem_value = item.get("stem") or _stem_from_name(str(item.get("name") or ""))
             is_main = _is_main_stem(stem_value)
 
-            prompt_override = _build_batch_prompt(templates, is_main, str(options.get("extra_prompt") or ""), use_english)
+            prompt_override = prompts["batch"][is_main]
             if style_prompt:
                 prompt_override = "\n\n".join([prompt_override, style_prompt]).strip()
 
@@ -699,8 +738,11 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
     target_height = int(ai_defaults.get("target_height") or options.get("target_height") or 2000)
     temperature = float(ai_defaults.get("default_temperature") or options.get("default_temperature") or 0.5)
     output_format = str(options.get("output_format") or "png").lower()
+    if not is_supported_output_format(output_format):
+        raise ValueError(f"Unsupported output_format: {output_format}")
     templates = options.get("prompt_templates") or {}
     use_english = bool(options.get("use_english"))
+    prompts = _build_job_prompts(templates, str(options.get("extra_prompt") or ""), use_english)
 
     results = []
 
@@ -722,9 +764,9 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
         head_output_url = None
         if do_main and head:
             is_main = True
-            prompt_override = _build_batch_prompt(templates, is_main, str(options.get("extra_prompt") or ""), use_english)
+            prompt_override = prompts["batch"][is_main]
             if not prompt_override:
-                prompt_override = str(options.get("extra_prompt") or "")
+                prompt_override = prompts["extra_prompt"]
             output_key = f"image-studio/{sku_name}/{_stem_from_name(head.get('name') or _safe_filename_from_url(head.get('url') or ''))}_{int(time.time())}.{output_format}"
             output_url, meta = _process_single_image(
                 api_key,
@@ -747,23 +789,16 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
                 "metadata": meta,
             })
             if options.get("include_style_prompt"):
-                instruction = _pick_prompt(templates, "style_extract_instruction_cn", use_english)
+                instruction = prompts["style_instruction"]
                 if instruction:
                     with tempfile.TemporaryDirectory() as temp_dir:
                         temp_path = Path(temp_dir) / f"head.{output_format}"
                         _download_to_file(output_url, temp_path)
                         style_prompt = _encode_style_prompt(temp_path, api_key, api_base, model, instruction)
 
-        for item in sources_sorted:
-            if item is head:
-                continue
-            stem_value = item.get("stem") or _stem_from_name(str(item.get("name") or ""))
-            is_main = _is_main_stem(stem_value)
-            if is_main and not do_main:
-                continue
-            if (not is_main) and not do_secondary:
-                continue
-            prompt_override = _build_batch_prompt(templates, is_main, str(options.get("extra_prompt") or ""), use_english)
+        def _process_one(item: Dict[str, Any], is_main: bool) -> Dict[str, Any]:
+            check_cancelled()
+            prompt_override = prompts["batch"][is_main]
             if style_prompt and (not is_main):
                 prompt_override = "\n\n".join([prompt_override, style_prompt]).strip()
             output_key = f"image-studio/{sku_name}/{_stem_from_name(item.get('name') or _safe_filename_from_url(item.get('url') or ''))}_{int(time.time())}.{output_format}"
@@ -780,12 +815,61 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
                 output_format,
                 is_main,
             )
-            results.append({
+            check_cancelled()
+            return {
                 "sku": sku_name,
                 "source_url": item.get("url"),
                 "result_url": output_url,
                 "metadata": meta,
-            })
+            }
+
+        tasks = []
+        for item in sources_sorted:
+            if item is head:
+                continue
+            stem_value = item.get("stem") or _stem_from_name(str(item.get("name") or ""))
+            is_main = _is_main_stem(stem_value)
+            if is_main and not do_main:
+                continue
+            if (not is_main) and not do_secondary:
+                continue
+            tasks.append((item, is_main))
+        if not tasks:
+            return head_output_url
+
+        # The head runs first (the style prompt depends on it); the rest are
+        # independent download -> model call -> upload chains and run concurrently
+        max_workers = 0
+        try:
+            max_workers = int(options.get("concurrency") or 0)
+        except Exception:
+            max_workers = 0
+        if max_workers <= 0:
+            max_workers = 8
+        max_workers = max(1, min(max_workers, 60, len(tasks)))
+
+        ctx = capture_job_context()
+        ordered: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(run_in_job_context, ctx, _process_one, item, is_main): idx
+                for idx, (item, is_main) in enumerate(tasks)
+            }
+            pending = set(futures.keys())
+            try:
+                while pending:
+                    check_cancelled()
+                    done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        ordered[futures[future]] = future.result()
+            finally:
+                for f in pending:
+                    try:
+                        f.cancel()
+                    except Exception:
+                        pass
+        # Same order as the sequential loop produced
+        results.extend(ordered)
 
         return head_output_url
 
@@ -832,7 +916,7 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
         do_secondary = mode in {"batch_secondary_generate", "batch_series_generate"}
 
         # Build prompt for main images
-        prompt_main = _build_batch_prompt(templates, True, str(options.get("extra_prompt") or ""), use_english)
+        prompt_main = prompts["batch"][True]
 
         # Process batch with async main images if available
         try:
@@ -878,6 +962,7 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
                     templates=templates,
                     use_english=use_english,
                     options=options,
+                    prompts=prompts,
                 )
                 batch_results.extend(secondary_results)
 
@@ -900,6 +985,7 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
                 templates=templates,
                 use_english=use_english,
                 options=options,
+                prompts=prompts,
             )
 
         return {"mode": mode, "items": batch_results}
@@ -919,7 +1005,7 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
         is_main = _is_main_stem(stem_value)
         style_prompt = ""
         if options.get("include_style") and (not is_main):
-            instruction = _pick_prompt(templates, "style_extract_instruction_cn", use_english)
+            instruction = prompts["style_instruction"]
             if instruction:
                 with tempfile.TemporaryDirectory() as temp_dir:
                     temp_path = Path(temp_dir) / f"head.{output_format}"
@@ -931,10 +1017,10 @@ def run_image_studio_job(payload: Dict[str, Any]) -> Dict[str, Any]:
         elif mode == "image_custom_generate":
             prompt_override = _build_custom_prompt(templates, options, is_main, style_prompt, use_english)
         else:
-            prompt_override = _build_batch_prompt(templates, is_main, str(options.get("extra_prompt") or ""), use_english)
+            prompt_override = prompts["batch"][is_main]
 
         if not prompt_override:
-            prompt_override = str(options.get("extra_prompt") or "")
+            prompt_override = prompts["extra_prompt"]
 
         output_key = f"image-studio/{sku or 'single'}/{stem_value}_{int(time.time())}.{output_format}"
         output_url, meta = _process_single_image(
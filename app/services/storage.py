@@ -4,6 +4,7 @@ import boto3
 from botocore.client import Config as BotoConfig
 import hashlib
 import asyncio
+from typing import BinaryIO, Dict, Optional
 from app.core.config import settings
 
 
@@ -47,7 +48,17 @@ class R2Service:
         # Return public URL
         return f"{self.public_url}/{key}"
 
-    async def upload_bytes(self, data: bytes, key: str, content_type: str = "image/jpeg") -> str:
+    def get_public_url(self, key: str) -> str:
+        """Build the public URL for an R2 key"""
+        return f"{self.public_url}/{key}"
+
+    async def upload_bytes(
+        self,
+        data: bytes,
+        key: str,
+        content_type: str = "image/jpeg",
+        metadata: Optional[Dict[str, str]] = None,
+    ) -> str:
         """
         Upload bytes directly to R2 with custom key (for Ozon plugin).
 
@@ -55,11 +66,12 @@ class R2Service:
             data: Binary data to upload
             key: R2 storage key (full path)
             content_type: MIME type
+            metadata: Optional user metadata (lowercase ASCII keys/values)
 
         Returns:
             Public URL
         """
-        await self._upload_async(data, key, content_type)
+        await self._upload_async(data, key, content_type, metadata)
         return f"{self.public_url}/{key}"
 
     def upload_bytes_sync(self, data: bytes, key: str, content_type: str = "image/jpeg") -> str:
@@ -82,8 +94,15 @@ class R2Service:
         )
         return f"{self.public_url}/{key}"
 
-    async def _upload_async(self, data: bytes, key: str, content_type: str) -> None:
+    async def _upload_async(
+        self,
+        data: bytes,
+        key: str,
+        content_type: str,
+        metadata: Optional[Dict[str, str]] = None,
+    ) -> None:
         """Async wrapper for boto3 upload (runs in thread pool)"""
+        extra = {"Metadata": metadata} if metadata else {}
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(
             None,
@@ -91,7 +110,8 @@ class R2Service:
                 Bucket=self.bucket_name,
                 Key=key,
                 Body=data,
-                ContentType=content_type
+                ContentType=content_type,
+                **extra
             )
         )
 
@@ -125,6 +145,21 @@ class R2Service:
         except Exception:
             return False
 
+    async def get_metadata(self, key: str) -> Optional[Dict[str, str]]:
+        """Return an object's user metadata, or None if it does not exist"""
+        try:
+            loop = asyncio.get_event_loop()
+            response = await loop.run_in_executor(
+                None,
+                lambda: self.s3_client.head_object(
+                    Bucket=self.bucket_name,
+                    Key=key
+                )
+            )
+            return response.get("Metadata") or {}
+        except Exception:
+            return None
+
     async def upload_bytes_async(
         self,
         data: bytes,
@@ -148,6 +183,26 @@ class R2Service:
         await self._upload_async(data, key, content_type)
         return f"{self.public_url}/{key}"
 
+    async def upload_fileobj_async(
+        self,
+        fileobj: BinaryIO,
+        key: str,
+        content_type: str = "application/octet-stream",
+    ) -> str:
+        """
+        Upload a file-like object (e.g. an in-memory BytesIO) to R2 asynchronously.
+
+        Args:
+            fileobj: Readable binary file object, positioned at the start
+            key: Storage key/path
+            content_type: MIME type
+
+        Returns:
+            Public URL of uploaded file
+        """
+        await self._upload_async(fileobj, key, content_type)
+        return f"{self.public_url}/{key}"
+
     async def upload_batch_async(
         self,
         items: list[dict],  # Each with 'data', 'key', 'content_type'
@@ -0,0 +1,19 @@
+import pytest
+
+from app.core import cpu
+
+
+def test_check_pillow_simd_cpu_refuses_without_avx2(monkeypatch):
+    """Pillow-SIMD on a CPU without AVX2 must fail at startup, not SIGILL later"""
+    monkeypatch.setattr(cpu, "pillow_simd_installed", lambda: True)
+    monkeypatch.setattr(cpu, "cpu_flags", lambda: {"sse4_2", "avx"})
+    with pytest.raises(RuntimeError, match="AVX2"):
+        cpu.check_pillow_simd_cpu()
+
+    monkeypatch.setattr(cpu, "cpu_flags", lambda: {"avx", "avx2"})
+    cpu.check_pillow_simd_cpu()
+
+    # Stock Pillow runs anywhere
+    monkeypatch.setattr(cpu, "pillow_simd_installed", lambda: False)
+    monkeypatch.setattr(cpu, "cpu_flags", lambda: set())
+    cpu.check_pillow_simd_cpu()
@@ -127,11 +127,15 @@ def test_image_studio_engine_async_functions():
     assert inspect.iscoroutinefunction(process_batch_main_async)
 
 
-def test_webp_encoding_in_encode_image():
-    """Test that encode_image_for_model uses WebP."""
-    from app.services.image_studio_engine import encode_image_for_model
+def test_model_format_encoding_in_encode_image():
+    """Test that encode_image_for_model uses the model-input format (JPEG)."""
+    from app.services.image_studio_engine import (
+        MODEL_IMAGE_FORMAT,
+        MODEL_IMAGE_MIME,
+        encode_image_for_model,
+    )
     from PIL import Image
-    import re
+    import io
 
     # Create a test image
     img = Image.new('RGB', (100, 100), color='red')
@@ -147,6 +151,9 @@ def test_webp_encoding_in_encode_image():
     import base64
     decoded = base64.b64decode(b64)
 
-    # Should be WebP format (RIFF....WEBP)
-    assert decoded[:4] == b"RIFF"
-    assert b"WEBP" in decoded[:12]
+    # Should be JPEG (SOI marker) and match the advertised format/MIME type
+    assert MODEL_IMAGE_FORMAT == "JPEG"
+    assert decoded[:3] == b"\xff\xd8\xff"
+    decoded_img = Image.open(io.BytesIO(decoded))
+    assert decoded_img.format == MODEL_IMAGE_FORMAT
+    assert Image.MIME[decoded_img.format] == MODEL_IMAGE_MIME
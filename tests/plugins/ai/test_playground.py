@@ -0,0 +1,48 @@
+import pytest
+from app.plugins.ai.playground import AiPlaygroundPlugin
+
+
+@pytest.mark.asyncio
+async def test_batch_optimization_runs_whole_batch_through_bulk_path(mocker):
+    """Test that a multi-image batch optimization is optimized in one bulk call, in order."""
+    plugin = AiPlaygroundPlugin({"api_key": "k", "api_base": "https://llm"})
+    urls = ["https://img/1.jpg", "https://img/2.jpg", "https://img/3.jpg"]
+
+    mocker.patch.object(plugin.processor, "download_image", mocker.AsyncMock(side_effect=lambda url: url.encode()))
+    bulk = mocker.patch.object(
+        plugin.processor,
+        "process_batch_optimization_bulk",
+        mocker.AsyncMock(side_effect=lambda images, **kw: [(b"opt:" + data, {"n": i}) for i, data in enumerate(images)]),
+    )
+    single = mocker.patch.object(plugin.processor, "process_batch_optimization", mocker.AsyncMock())
+    upload = mocker.patch.object(plugin.r2, "upload", mocker.AsyncMock(side_effect=lambda data, filename, content_type: f"https://r2/{filename}"))
+
+    result = await plugin.process({
+        "job_id": "j1",
+        "type": "batch_optimization",
+        "config": {"quality": "high", "format": "jpg", "maxSize": 800},
+        "source_image_urls": urls,
+    })
+
+    assert result["success"]
+    single.assert_not_called()
+    bulk.assert_awaited_once()
+    assert bulk.await_args.args[0] == [u.encode() for u in urls]
+    assert bulk.await_args.kwargs == {"quality": "high", "output_format": "jpg", "max_size": 800, "maintain_aspect": True}
+    assert [c.kwargs["data"] for c in upload.await_args_list] == [b"opt:" + u.encode() for u in urls]
+    assert result["data"]["result_image_urls"] == [f"https://r2/ai_playground_j1_{i}.png" for i in (1, 2, 3)]
+    assert plugin.get_job_status("j1")["progress"] == 100
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("config,expected", [({}, False), ({"reuseCachedResult": True}, True)])
+async def test_background_replacement_reuses_cache_only_on_opt_in(mocker, config, expected):
+    """Test that sampled background generations bypass the response cache unless requested."""
+    plugin = AiPlaygroundPlugin({"api_key": "k", "api_base": "https://llm"})
+    replace = mocker.patch.object(
+        plugin.processor, "process_background_replacement", mocker.AsyncMock(return_value=(b"out", {}))
+    )
+
+    await plugin._process_single_image("background_replacement", b"img", {"backgroundPrompt": "studio", **config})
+
+    assert replace.await_args.kwargs["cache_check"] is expected
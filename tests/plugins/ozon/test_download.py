@@ -0,0 +1,40 @@
+import pytest
+from app.plugins.ozon import download as download_module
+from app.plugins.ozon.download import (
+    SOURCE_URL_META_KEY,
+    OzonDownloadPlugin,
+    _source_url_digest,
+)
+
+@pytest.mark.asyncio
+async def test_existing_object_reused_only_for_same_source_url(mocker):
+    """Test that an R2 object is skipped only when it came from the same Ozon URL."""
+    plugin = OzonDownloadPlugin({"skip_existing": True})
+    urls = ["https://ozon.ru/a.jpg", "https://ozon.ru/b_new.jpg"]
+
+    client = mocker.Mock()
+    client.find_product_id = mocker.AsyncMock(return_value=1)
+    client.get_picture_urls = mocker.AsyncMock(return_value=urls)
+
+    # Slot 1 still holds a.jpg; slot 2 holds an image that was since replaced
+    metadata = {
+        1: {SOURCE_URL_META_KEY: _source_url_digest(urls[0])},
+        2: {SOURCE_URL_META_KEY: _source_url_digest("https://ozon.ru/b_old.jpg")},
+    }
+    r2 = mocker.Mock()
+    r2.get_metadata = mocker.AsyncMock(side_effect=lambda path: metadata[int(path.rsplit("_", 1)[1].split(".")[0])])
+    r2.get_public_url = lambda path: f"https://r2/{path}"
+
+    upload = mocker.patch.object(
+        download_module,
+        "download_and_upload_to_r2",
+        mocker.AsyncMock(return_value=(True, "https://r2/new", None)),
+    )
+
+    result = await plugin._process_article(client, "u", "ART", "offer_id", r2)
+
+    assert result["success_images"] == 2
+    upload.assert_awaited_once()
+    kwargs = upload.await_args.kwargs
+    assert kwargs["url"] == urls[1]
+    assert kwargs["metadata"] == {SOURCE_URL_META_KEY: _source_url_digest(urls[1])}
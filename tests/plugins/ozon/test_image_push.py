@@ -90,3 +90,24 @@ async def test_build_response():
     assert result["data"]["updated"]["images360"] == 1
     assert result["data"]["updated"]["color_image"] == True
     assert result["data"]["current_images"] == current_urls
+
+@pytest.mark.asyncio
+async def test_validate_rejects_non_string_url():
+    """Test that non-string entries are reported with their string form."""
+    plugin = OzonImagePushPlugin({})
+
+    context = {
+        "product_id": 123456,
+        "images": ["https://r2.com/img1.jpg"],
+        "images360": [None, "http://r2.com/360_1.jpg"],
+        "color_image": None
+    }
+
+    result = plugin._validate(context)
+
+    assert result["errors"] == [{
+        "field": "images360",
+        "index": 0,
+        "url": "None",
+        "reason": "Invalid URL format"
+    }]
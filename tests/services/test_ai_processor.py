@@ -0,0 +1,144 @@
+import orjson
+
+from app.services.ai_processor import _build_request_body
+
+
+def test_build_request_body_is_valid_json():
+    """Spliced request body should match the equivalent json payload"""
+    prompt = 'Background: "studio" \\ white\nno shadows — 白色'
+    body = _build_request_body(b"aGVsbG8=", prompt, 0.5)
+
+    assert orjson.loads(body) == {
+        "contents": [
+            {
+                "parts": [
+                    {"inlineData": {"mimeType": "image/png", "data": "aGVsbG8="}},
+                    {"text": prompt}
+                ]
+            }
+        ],
+        "generationConfig": {"temperature": 0.5}
+    }
+
+
+def test_download_cache_dedupes_identical_content():
+    """URLs serving identical bytes should share one stored copy"""
+    from app.services.ai_processor import _DownloadCache
+
+    cache = _DownloadCache(max_entries=10, max_bytes=100)
+    cache.put("https://a/1.jpg", b"x" * 40, ttl=60, etag='"v1"')
+    cache.put("https://b/1.jpg", b"x" * 40, ttl=60, etag=None)
+    cache.put("https://a/2.jpg", b"y" * 40, ttl=0, etag='"v2"')
+
+    assert cache._bytes == 80
+    assert cache.get("https://a/1.jpg") == (b"x" * 40, '"v1"', True)
+    # Expired entries stay available for ETag revalidation
+    assert cache.get("https://a/2.jpg") == (b"y" * 40, '"v2"', False)
+
+    # Exceeding the byte budget evicts least recently used URLs
+    cache.put("https://c/1.jpg", b"z" * 40, ttl=60, etag=None)
+    assert cache.get("https://b/1.jpg") == (None, None, False)
+    assert cache._bytes <= 100
+
+
+def test_pooled_writer_caps_retained_buffer():
+    """Buffers are allocated on first write and never retained past the cap"""
+    import threading
+
+    from app.services import ai_processor as ap
+
+    seen = {}
+
+    def run():
+        with ap._PooledWriter():
+            pass
+        seen["unused"] = getattr(ap._BUF_POOL, "buf", None)
+        with ap._PooledWriter() as w:
+            chunk = b"b" * (1 << 20)
+            for _ in range((ap._BUF_MAX_RETAINED >> 20) + 8):
+                w.write(chunk)
+            seen["written"] = w.tell()
+            seen["tail"] = bytes(w.getbuffer()[-3:])
+        seen["retained"] = len(ap._BUF_POOL.buf)
+
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+
+    assert seen["unused"] is None
+    assert seen["written"] == ap._BUF_MAX_RETAINED + (8 << 20)
+    assert seen["tail"] == b"bbb"
+    assert seen["retained"] <= ap._BUF_MAX_RETAINED
+
+
+def test_download_image_sync_uses_shared_client_and_revalidates(monkeypatch):
+    """Sync downloads should reuse one client (no per-call event loop) and honour ETags"""
+    import httpx
+
+    from app.services import ai_processor as ap
+
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"', "cache-control": "max-age=0"})
+        return httpx.Response(200, content=b"img", headers={"etag": '"v1"', "cache-control": "max-age=0"})
+
+    monkeypatch.setattr(ap, "_SYNC_CLIENT", httpx.Client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(ap, "_DOWNLOAD_CACHE", ap._DownloadCache())
+    downloaders = len(ap._DOWNLOADERS)
+
+    url = "https://example.com/a.jpg"
+    assert ap.AiImageProcessor.download_image_sync(url) == b"img"
+    assert ap.AiImageProcessor.download_image_sync(url) == b"img"
+
+    assert seen == [None, '"v1"']
+    assert len(ap._DOWNLOADERS) == downloaders
+
+
+def test_download_without_cache_control_is_revalidated(monkeypatch):
+    """Responses without max-age must not be served from cache unchecked"""
+    import httpx
+
+    from app.services import ai_processor as ap
+
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(200, content=b"new", headers={"etag": '"v2"'})
+        return httpx.Response(200, content=b"old", headers={"etag": '"v1"'})
+
+    monkeypatch.setattr(ap, "_SYNC_CLIENT", httpx.Client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(ap, "_DOWNLOAD_CACHE", ap._DownloadCache())
+
+    url = "https://example.com/image_1.jpg"
+    assert ap.AiImageProcessor.download_image_sync(url) == b"old"
+    assert ap.AiImageProcessor.download_image_sync(url) == b"new"
+
+    assert seen == [None, '"v1"']
+
+
+def test_fused_sharpen_smooth_kernel_approximates_two_pass_filter():
+    """The fused 5x5 kernel matches SHARPEN+SMOOTH except where the chain clips
+
+    Compared on the interior (the fused kernel leaves a 2 px border unfiltered):
+    exact (rounding only) when sharpening stays within 0..255, and within 32
+    levels on a full-range black/white edge where the two-pass chain clips.
+    """
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    from app.services.ai_processor import _SHARPEN_SMOOTH
+
+    def max_interior_diff(lo, hi):
+        x = np.arange(64)[None, :].repeat(64, axis=0)
+        image = Image.fromarray(np.where(x < 32, lo, hi).astype(np.uint8)).convert("RGB")
+        fused = np.asarray(image.filter(_SHARPEN_SMOOTH), dtype=np.int16)
+        two_pass = np.asarray(image.filter(ImageFilter.SHARPEN).filter(ImageFilter.SMOOTH), dtype=np.int16)
+        return int(np.abs(fused - two_pass)[2:-2, 2:-2].max())
+
+    assert max_interior_diff(60, 190) <= 1
+    assert max_interior_diff(0, 255) <= 32
@@ -0,0 +1,66 @@
+import numpy as np
+
+from app.services.image_studio_engine import _letterbox_size, _scan_white_bounds
+
+
+def test_scan_white_bounds_counts_edge_runs():
+    """White runs should be measured from each edge up to the content box"""
+    arr = np.full((100, 80, 3), 255, dtype=np.uint8)
+    arr[10:95, 20:70] = 30
+
+    assert _scan_white_bounds(arr, 2, 245, 0.985) == (10, 5, 20, 10)
+
+
+def test_scan_white_bounds_all_white():
+    """A fully white image is one run spanning every line"""
+    arr = np.full((50, 40, 3), 250, dtype=np.uint8)
+
+    assert _scan_white_bounds(arr, 2, 245, 0.985) == (50, 50, 40, 40)
+
+
+def test_scan_white_bounds_tolerates_sparse_dark_pixels():
+    """A line stays white while its sampled white ratio is at least ratio_thr"""
+    arr = np.full((100, 100, 3), 255, dtype=np.uint8)
+    arr[20:80, 20:80] = 0
+    # One dark sample out of 50 per row (ratio 0.98 < 0.985) ends the top run early
+    arr[5, 0] = 0
+
+    assert _scan_white_bounds(arr, 2, 245, 0.985) == (5, 20, 20, 20)
+    assert _scan_white_bounds(arr, 2, 245, 0.98) == (20, 20, 20, 20)
+
+
+def test_letterbox_size_pads_to_three_by_four():
+    """Wide images grow in height, tall images in width, to a 3:4 frame"""
+    assert _letterbox_size(1200, 1200) == (1200, 1600)
+    assert _letterbox_size(600, 1600) == (1200, 1600)
+
+
+def test_scan_white_bounds_dense_counts_every_pixel():
+    """With stride 1 a single dark pixel in 100 keeps a row white at 0.985"""
+    arr = np.full((100, 100, 3), 255, dtype=np.uint8)
+    arr[20:80, 20:80] = 0
+    arr[5, 0] = 0
+
+    assert _scan_white_bounds(arr, 1, 245, 0.985) == (20, 20, 20, 20)
+
+
+def test_unsupported_output_format_rejected_before_model_call(tmp_path):
+    """An output suffix Pillow cannot write fails fast, without calling the model"""
+    from unittest import mock
+
+    from app.services.image_studio_engine import is_supported_output_format, process_image_with_nano_banana
+
+    assert is_supported_output_format("png")
+    assert is_supported_output_format("TIFF")
+    assert not is_supported_output_format("heic-ish")
+
+    client = mock.Mock()
+    ok, msg = process_image_with_nano_banana(
+        "key", "https://api", "model",
+        str(tmp_path / "in.png"), str(tmp_path / "out.xyz"),
+        "prompt", 0.5, 100, 100,
+        client=client,
+    )
+
+    assert (ok, msg) == (False, "Unsupported output format: .xyz")
+    assert not client.method_calls
@@ -0,0 +1,222 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from app.services.image_studio_queue import (
+    JobQueue,
+    _LogRing,
+    capture_job_context,
+    check_cancelled,
+    get_cancel_event,
+    run_in_job_context,
+    wait_cancelled,
+)
+
+
+@pytest.fixture(scope="module")
+def job_queue(tmp_path_factory):
+    # One queue per module: each started queue wraps sys.stdout/sys.stderr
+    q = JobQueue(lanes=["t"], lane_workers={"t": 2}, log_dir=str(tmp_path_factory.mktemp("job_logs")))
+    q.start()
+    yield q
+    q.stop()
+
+
+def _route_output(q, monkeypatch):
+    # pytest's capture swaps sys.stdout/sys.stderr for every test phase, so the
+    # router start() installed is gone by now: call this in the test body to wrap
+    # the streams the test actually prints to (monkeypatch restores them after).
+    # Under -s the old router is still there; unwrap it instead of stacking two.
+    monkeypatch.setattr(sys, "stdout", getattr(sys.stdout, "_original", sys.stdout))
+    monkeypatch.setattr(sys, "stderr", getattr(sys.stderr, "_original", sys.stderr))
+    monkeypatch.setattr(q, "_router_installed", False)
+    q._install_router()
+
+
+def _wait_done(q, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = q.get(job_id)
+        if job and job["status"] in {"success", "failed", "cancelled"}:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_output_routed_to_job_log(job_queue, monkeypatch):
+    """Printed output should land in the job's in-memory log and log file"""
+    _route_output(job_queue, monkeypatch)
+
+    def runner():
+        print("hello")
+        print("a", end="")
+        print("b")
+        return "done"
+
+    job_id = job_queue.enqueue("test", "sku", "stem", {}, runner, lane="t")
+    job = _wait_done(job_queue, job_id)
+
+    assert job["status"] == "success"
+    assert job["result"] == "done"
+    assert job_queue.get_log(job_id) == "hello\nab\n"
+    assert Path(job["log_path"]).read_text() == "hello\nab\n"
+
+
+def test_concurrent_jobs_keep_their_own_lines(job_queue, monkeypatch):
+    """Concurrent workers should each log only their own, unbroken lines"""
+    _route_output(job_queue, monkeypatch)
+
+    def make_runner(tag):
+        def runner():
+            for i in range(200):
+                print(f"{tag}-{i}")
+        return runner
+
+    ids = {tag: job_queue.enqueue("test", tag, tag, {}, make_runner(tag), lane="t") for tag in ("x", "y")}
+    for tag, job_id in ids.items():
+        _wait_done(job_queue, job_id)
+        lines = job_queue.get_log(job_id).splitlines()
+        assert lines == [f"{tag}-{i}" for i in range(200)]
+
+
+def test_log_ring_keeps_last_bytes():
+    """The ring should hold exactly the newest `limit` bytes across wraparounds"""
+    ring = _LogRing(8)
+    expected = b""
+    for chunk in (b"abc", b"defgh", b"ij", b"klmnopq", b"", b"0123456789"):
+        ring.append(chunk)
+        expected = (expected + chunk)[-8:]
+        assert ring.getvalue() == expected
+
+
+def test_get_log_chunk_reads_from_offset_and_tail(job_queue, monkeypatch):
+    """Chunks should be served from the log file by offset or as a tail"""
+    _route_output(job_queue, monkeypatch)
+
+    def runner():
+        print("0123456789")
+
+    job_id = job_queue.enqueue("test", "sku", "stem", {}, runner, lane="t")
+    _wait_done(job_queue, job_id)
+
+    chunk = job_queue.get_log_chunk(job_id, from_bytes=4)
+    assert (chunk["log"], chunk["from"], chunk["to"], chunk["total"]) == ("456789\n", 4, 11, 11)
+    assert job_queue.get_log_chunk(job_id, tail_bytes=3)["log"] == "89\n"
+    assert job_queue.get_log_chunk("missing") is None
+
+
+def test_cancel_reaches_helper_threads(job_queue):
+    """check_cancelled in a thread running the captured context should see a cancel"""
+    import threading
+
+    started = threading.Event()
+
+    def runner():
+        ctx = capture_job_context()
+        started.set()
+        assert get_cancel_event().wait(5)
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(run_in_job_context(ctx, get_cancel_event).is_set()))
+        t.start()
+        t.join()
+        assert seen == [True]
+        check_cancelled()
+
+    job_id = job_queue.enqueue("test", "sku", "stem", {}, runner, lane="t")
+    assert started.wait(5)
+    job_queue.cancel(job_id)
+
+    assert _wait_done(job_queue, job_id)["status"] == "cancelled"
+    assert get_cancel_event() is None
+
+
+def test_wait_cancelled_wakes_on_cancel(job_queue):
+    """wait_cancelled should return True as soon as the job is cancelled"""
+    import threading
+
+    started = threading.Event()
+    waited = []
+
+    def runner():
+        started.set()
+        t0 = time.time()
+        waited.append((wait_cancelled(10), time.time() - t0))
+
+    job_id = job_queue.enqueue("test", "sku", "stem", {}, runner, lane="t")
+    assert started.wait(5)
+    job_queue.cancel(job_id)
+    _wait_done(job_queue, job_id)
+
+    assert waited[0][0] is True
+    assert waited[0][1] < 5
+    assert wait_cancelled(0) is False
+
+
+def test_get_returns_read_only_view(job_queue):
+    """get() should hand out a read-only view that later updates do not touch"""
+    job_id = job_queue.enqueue("test", "sku", "stem", {}, lambda: "ok", lane="t")
+    _wait_done(job_queue, job_id)
+    job = job_queue.get(job_id)
+
+    with pytest.raises(TypeError):
+        job["status"] = "queued"
+    job_queue.cancel(job_id)
+    assert job["status"] == "success"
+    assert job_queue.snapshot()["jobs"][-1]["id"] == job_id
+
+
+def test_log_bytes_published_on_finish(job_queue, monkeypatch):
+    """The per-job byte count should match the log file once the job finishes"""
+    _route_output(job_queue, monkeypatch)
+
+    def runner():
+        print("x" * 10)
+        print("é")
+
+    job_id = job_queue.enqueue("test", "sku", "stem", {}, runner, lane="t")
+    job = _wait_done(job_queue, job_id)
+
+    assert job["log_bytes"] == Path(job["log_path"]).stat().st_size == 14
+
+
+def test_get_log_chunk_fd_returns_open_range(job_queue, monkeypatch):
+    """The raw variant should hand back an fd positioned by the same offsets"""
+    _route_output(job_queue, monkeypatch)
+
+    import os
+
+    def runner():
+        print("0123456789")
+
+    job_id = job_queue.enqueue("test", "sku", "stem", {}, runner, lane="t")
+    _wait_done(job_queue, job_id)
+
+    fd, start, length, total = job_queue.get_log_chunk_fd(job_id, tail_bytes=3)
+    try:
+        assert (start, length, total) == (8, 3, 11)
+        assert os.pread(fd, length, start) == b"89\n"
+    finally:
+        os.close(fd)
+    assert job_queue.get_log_chunk_fd("missing") is None
+
+
+def test_restart_restores_fifo_order(tmp_path):
+    """Jobs requeued by stopped workers come back in enqueue order, without sentinels"""
+    q = JobQueue(lanes=["t"], log_dir=str(tmp_path))
+    ids = [q.enqueue("test", "sku", str(i), {}, lambda: None, lane="t") for i in range(4)]
+    lane = q._queues["t"]
+
+    # What stop() leaves behind: a worker's dequeued job put back at the tail,
+    # behind the remaining jobs and an unconsumed sentinel
+    first = lane.get()
+    lane.put(None)
+    lane.put(first)
+
+    q._restore_queue_order()
+
+    drained = []
+    while not lane.empty():
+        drained.append(lane.get())
+    assert [job_id for job_id, _ in drained] == ids